@@ -0,0 +1,118 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from discord_birthday_bot import database_util
+
+EXECUTOR = None
+
+
+def startup(workers):
+    """Creates the executor the database calls are offloaded to.
+    The number of workers should not exceed the size of the connection pool, so no worker waits for a connection."""
+    global EXECUTOR
+    EXECUTOR = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='database')
+
+
+def shutdown():
+    """Waits for all pending database calls and stops the executor."""
+    global EXECUTOR
+    if EXECUTOR is not None:
+        EXECUTOR.shutdown(wait=True)
+        EXECUTOR = None
+
+
+async def run(func, *args, **kwargs):
+    """Runs a blocking database function in the executor without blocking the event loop.
+    The function runs in a copy of the current context, so it sees e.g. the language of the calling guild."""
+    loop = asyncio.get_event_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(EXECUTOR, functools.partial(context.run, func, *args, **kwargs))
+
+
+async def delete(person):
+    """Deletes a person and its birthday. Returns the number of deleted rows or None."""
+    return await run(database_util.delete, person)
+
+
+async def queue_insert(person):
+    """Saves a person with the next flush of the write buffer. Returns False if nothing changed."""
+    return await run(database_util.queue_insert, person)
+
+
+async def queue_delete(person):
+    """Deletes a person with the next flush of the write buffer. Returns False if nothing changed."""
+    return await run(database_util.queue_delete, person)
+
+
+async def queue_delete_guild(guild_id):
+    """Deletes the guild in the greeting_channel table with the next flush of the write buffer."""
+    return await run(database_util.queue_delete_guild, guild_id)
+
+
+async def delete_all(guild_id):
+    """Deletes all birthdays of the guild."""
+    return await run(database_util.delete_all, guild_id)
+
+
+async def prune_members(guild_id, member_ids):
+    """Deletes the birthdays of all persons of the guild who are not among the given members."""
+    return await run(database_util.prune_members, guild_id, member_ids)
+
+
+async def get_upcoming(guild_id, day, days, limit=None):
+    """Returns the birthdays of the guild celebrated within the given number of days starting at the given day."""
+    return await run(database_util.get_upcoming, guild_id, day, days, limit)
+
+
+async def set_list_msg(guild_id, channel_id, msg_ids):
+    """Saves the channel id and the message ids of all pages of the list message."""
+    return await run(database_util.set_list_msg, guild_id, channel_id, msg_ids)
+
+
+async def remove_list_msg(guild_id):
+    """Removes the list message data from the given guild."""
+    return await run(database_util.remove_list_msg, guild_id)
+
+
+async def set_channel(guild_id, channel_id):
+    """Inserts an entry to the greeting_channel table."""
+    return await run(database_util.set_channel, guild_id, channel_id)
+
+
+async def set_timezone(guild_id, timezone, hour):
+    """Saves the timezone and the hour at which the guild is greeted."""
+    return await run(database_util.set_timezone, guild_id, timezone, hour)
+
+
+async def set_language(guild_id, language):
+    """Saves the language of the guild, None for the default language."""
+    return await run(database_util.set_language, guild_id, language)
+
+
+async def set_digest(guild_id, weekday):
+    """Saves the weekday of the weekly digest of upcoming birthdays, None disables it."""
+    return await run(database_util.set_digest, guild_id, weekday)
+
+
+async def set_greetings_sent(guild_id, day, person_ids):
+    """Marks the claimed greetings of the persons of the guild on the given day as sent."""
+    return await run(database_util.set_greetings_sent, guild_id, day, person_ids)
+
+
+async def set_last_greeting(guild_id, day):
+    """Saves the day the guild was greeted the last time."""
+    return await run(database_util.set_last_greeting, guild_id, day)
+
+
+async def get_greeting_settings(guild_id=None, shard_count=None, shard_ids=None):
+    """Returns the greeting settings of all guilds with a greeting channel, only of the given guild
+    or only of the guilds of the given shards."""
+    return await run(database_util.get_greeting_settings, guild_id, shard_count, shard_ids)
+
+
+async def get_channel_settings(guild_id=None, shard_count=None, shard_ids=None):
+    """Returns the greeting channel and the list message of all guilds, only of the given guild
+    or only of the guilds of the given shards."""
+    return await run(database_util.get_channel_settings, guild_id, shard_count, shard_ids)
@@ -0,0 +1,147 @@
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import NamedTuple
+
+
+class Entry(NamedTuple):
+    """Compact birthday of a person as plain numbers, sorted by the month-day like the birthday list."""
+    month_day: int
+    person_id: int
+    year: int
+
+
+def to_entry(person_id, birthday):
+    """Creates a compact calendar entry of month-day, person id and birth year."""
+    return Entry(birthday.month * 100 + birthday.day, person_id, birthday.year)
+
+
+class BirthdayCalendar:
+    """Process wide cache of the birthdays.
+
+    Every cached guild holds its entries as list of Entry(month-day, person id, birth year) sorted by the month-day.
+    The least recently used guilds are evicted as soon as more than max_entries entries are cached.
+
+    Data loaded from the database is only accepted if no write happened in the meantime,
+    so a slow load can never overwrite a newer write."""
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._guilds = OrderedDict()
+        self._size = 0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def version(self):
+        """Returns the current write version. Pass it to the put methods after loading from the database."""
+        with self._lock:
+            return self._version
+
+    def get_guild(self, guild_id):
+        """Returns the sorted entries of the guild or None if the guild is not cached."""
+        with self._lock:
+            entries = self._guilds.get(guild_id)
+            if entries is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._guilds.move_to_end(guild_id)
+            return list(entries)
+
+    def put_guild(self, guild_id, entries, version):
+        """Caches the entries of the guild loaded at the given write version."""
+        entries = sorted(entries)
+        with self._lock:
+            if version != self._version or len(entries) > self.max_entries:
+                return
+            self._drop_guild(guild_id)
+            self._guilds[guild_id] = entries
+            self._size += len(entries)
+            self._evict()
+
+    def get_guild_range(self, guild_id, first, last):
+        """Returns the entries of the guild between the two month-days (inclusive) or None if the guild is not cached."""
+        with self._lock:
+            entries = self._guilds.get(guild_id)
+            if entries is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._guilds.move_to_end(guild_id)
+            return entries[bisect_left(entries, (first,)):bisect_left(entries, (last + 1,))]
+
+    def set_birthday(self, guild_id, person_id, birthday):
+        """Writes the birthday of a person through to the cache.
+        Returns False if the guild is cached and the person has this birthday already, True otherwise."""
+        entry = to_entry(person_id, birthday)
+        with self._lock:
+            entries = self._guilds.get(guild_id)
+            if entries is not None:
+                i = bisect_left(entries, entry)
+                if i < len(entries) and entries[i] == entry:
+                    return False
+
+            self._version += 1
+            if entries is not None:
+                self._remove_person(entries, person_id)
+                insort(entries, entry)
+                self._size += 1
+                self._guilds.move_to_end(guild_id)
+                self._evict()
+            return True
+
+    def remove_person(self, guild_id, person_id):
+        """Removes a person from the cache.
+        Returns False if the guild is cached and the person has no birthday, True otherwise."""
+        with self._lock:
+            self._version += 1
+            entries = self._guilds.get(guild_id)
+            if entries is not None and not self._remove_person(entries, person_id):
+                return False
+            return True
+
+    def clear_guild(self, guild_id):
+        """Marks the guild as having no birthdays at all."""
+        with self._lock:
+            self._version += 1
+            self._drop_guild(guild_id)
+            self._guilds[guild_id] = []
+
+    def invalidate_guild(self, guild_id):
+        """Drops the guild, e.g. after a bulk import. It is loaded again on next access."""
+        with self._lock:
+            self._version += 1
+            self._drop_guild(guild_id)
+
+    def stats(self):
+        """Returns the hit, miss and eviction counters and the current size of the cache."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'guilds': len(self._guilds),
+                'entries': self._size
+            }
+
+    def _remove_person(self, entries, person_id):
+        for i, entry in enumerate(entries):
+            if entry[1] == person_id:
+                del entries[i]
+                self._size -= 1
+                return True
+        return False
+
+    def _drop_guild(self, guild_id):
+        entries = self._guilds.pop(guild_id, None)
+        if entries is not None:
+            self._size -= len(entries)
+
+    def _evict(self):
+        while self._size > self.max_entries and len(self._guilds) > 1:
+            _, entries = self._guilds.popitem(last=False)
+            self._size -= len(entries)
+            self.evictions += 1
@@ -9,11 +9,20 @@ APP_NAME = 'discord_birthday_bot'
 CONFIG_DIR = appdirs.user_config_dir(APP_NAME)
 CONFIG_FILE_NAME = 'config'
 CONFIG_FILE_PATH = os.path.join(CONFIG_DIR, CONFIG_FILE_NAME)
+DATA_DIR = appdirs.user_data_dir(APP_NAME)
 
 BOT_SECTION = 'Bot'
 BOT_TOKEN = ('token', '')
 BOT_PREFIX = ('prefix', '!bd')
 BOT_SPACE_AFTER_PREFIX = ('space_after_prefix', 'True')
+BOT_LIST_UPDATE_DELAY = ('list_update_delay', '5')
+BOT_GREETING_SPREAD = ('greeting_spread', '3600')
+BOT_SHARD_COUNT = ('shard_count', '')  # empty for the count recommended by discord
+BOT_SHARD_IDS = ('shard_ids', '')  # empty for all shards
+
+STORAGE_SECTION = 'Storage'
+STORAGE_BACKEND = ('backend', 'postgresql')  # postgresql or sqlite
+STORAGE_SQLITE_PATH = ('sqlite_path', '')  # empty for birthdays.db in the data directory
 
 DB_SECTION = 'PostgreSQL'
 DB_NAME = ('name', 'postgres')
@@ -21,6 +30,18 @@ DB_USER = ('username', 'postgres')
 DB_PASSWORD = ('password', '')
 DB_HOST = ('host', '127.0.0.1')
 DB_PORT = ('port', '5432')
+DB_POOL_MIN = ('pool_min', '1')
+DB_POOL_MAX = ('pool_max', '10')
+DB_FLUSH_INTERVAL_MS = ('flush_interval_ms', '200')  # write buffer of member and guild events
+DB_FLUSH_SIZE = ('flush_size', '500')
+
+CACHE_SECTION = 'Cache'
+CACHE_CALENDAR_SIZE = ('calendar_size', '100000')
+
+METRICS_SECTION = 'Metrics'
+METRICS_HOST = ('host', '127.0.0.1')
+METRICS_PORT = ('port', '0')
+METRICS_SLOW_LOG_MS = ('slow_log_ms', '')
 
 LOC_SECTION = 'Locale'
 LOC_LANGUAGE = ('language', 'en_US')
@@ -35,20 +56,31 @@ config.read(CONFIG_FILE_PATH)
 
 
 def init_section(section, options):
-    """Creates all sections and options if not existing."""
+    """Creates all sections and options if not existing. Returns True if anything was added, False otherwise."""
+    changed = False
     if not config.has_section(section):
         config.add_section(section)
+        changed = True
     for option in options:
         if not config.has_option(section, option[0]):
             config.set(section, option[0], option[1])
+            changed = True
+    return changed
 
 
-init_section(BOT_SECTION, [BOT_TOKEN, BOT_PREFIX, BOT_SPACE_AFTER_PREFIX])
-init_section(DB_SECTION, [DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT])
-init_section(LOC_SECTION, [LOC_LANGUAGE])
+changed = init_section(BOT_SECTION, [BOT_TOKEN, BOT_PREFIX, BOT_SPACE_AFTER_PREFIX, BOT_LIST_UPDATE_DELAY,
+                                     BOT_GREETING_SPREAD, BOT_SHARD_COUNT, BOT_SHARD_IDS])
+changed |= init_section(STORAGE_SECTION, [STORAGE_BACKEND, STORAGE_SQLITE_PATH])
+changed |= init_section(DB_SECTION, [DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_POOL_MIN, DB_POOL_MAX,
+                                     DB_FLUSH_INTERVAL_MS, DB_FLUSH_SIZE])
+changed |= init_section(CACHE_SECTION, [CACHE_CALENDAR_SIZE])
+changed |= init_section(METRICS_SECTION, [METRICS_HOST, METRICS_PORT, METRICS_SLOW_LOG_MS])
+changed |= init_section(LOC_SECTION, [LOC_LANGUAGE])
 
-with open(CONFIG_FILE_PATH, 'w+') as config_file:
-    config.write(config_file)
+# only write the config if options were missing #
+if changed:
+    with open(CONFIG_FILE_PATH, 'w+') as config_file:
+        config.write(config_file)
 
 
 def get_token():
@@ -63,6 +95,37 @@ def is_space_after_prefix():
     return config.getboolean(BOT_SECTION, BOT_SPACE_AFTER_PREFIX[0])
 
 
+def get_list_update_delay():
+    return config.getfloat(BOT_SECTION, BOT_LIST_UPDATE_DELAY[0])
+
+
+def get_greeting_spread():
+    return config.getint(BOT_SECTION, BOT_GREETING_SPREAD[0])
+
+
+def get_shard_count():
+    value = config.get(BOT_SECTION, BOT_SHARD_COUNT[0])
+    if value == '':
+        return None
+    return int(value)
+
+
+def get_shard_ids():
+    return config.get(BOT_SECTION, BOT_SHARD_IDS[0])
+
+
+def get_storage_backend():
+    return config.get(STORAGE_SECTION, STORAGE_BACKEND[0])
+
+
+def get_sqlite_path():
+    path = config.get(STORAGE_SECTION, STORAGE_SQLITE_PATH[0])
+    if path == '':
+        Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
+        path = os.path.join(DATA_DIR, 'birthdays.db')
+    return path
+
+
 def get_db_name():
     return config.get(DB_SECTION, DB_NAME[0])
 
@@ -83,6 +146,41 @@ def get_db_port():
     return config.get(DB_SECTION, DB_PORT[0])
 
 
+def get_db_pool_min():
+    return config.getint(DB_SECTION, DB_POOL_MIN[0])
+
+
+def get_db_pool_max():
+    return config.getint(DB_SECTION, DB_POOL_MAX[0])
+
+
+def get_db_flush_interval():
+    return config.getint(DB_SECTION, DB_FLUSH_INTERVAL_MS[0]) / 1000
+
+
+def get_db_flush_size():
+    return config.getint(DB_SECTION, DB_FLUSH_SIZE[0])
+
+
+def get_calendar_size():
+    return config.getint(CACHE_SECTION, CACHE_CALENDAR_SIZE[0])
+
+
+def get_metrics_host():
+    return config.get(METRICS_SECTION, METRICS_HOST[0])
+
+
+def get_metrics_port():
+    return config.getint(METRICS_SECTION, METRICS_PORT[0])
+
+
+def get_metrics_slow_log_ms():
+    value = config.get(METRICS_SECTION, METRICS_SLOW_LOG_MS[0])
+    if value == '':
+        return None
+    return float(value)
+
+
 def get_language():
     l = config.get(LOC_SECTION, LOC_LANGUAGE[0])
     if l == '':
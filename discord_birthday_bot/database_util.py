@@ -1,237 +1,464 @@
-import psycopg2
-
-from discord_birthday_bot import date_util
+import threading
+from datetime import timedelta
+
+from discord_birthday_bot import calendar_util, date_util, metrics_util, storage_util
+
+STORAGE = None
+CALENDAR = calendar_util.BirthdayCalendar()
+BUFFER = None
+
+GREETING_LOG_DAYS = 7  # days the greeting log is kept
+PRUNE_CHUNK_SIZE = 1000
+SWEEP_CHUNK_SIZE = 500  # birthday children read at once by the daily check
+MAX_ID = 2 ** 63 - 1  # largest BIGINT
+
+
+class WriteBuffer:
+    """Collects the writes of member and guild events and saves them in a single transaction,
+    either every interval seconds or as soon as batch_size changes are pending.
+
+    Multiple changes of the same birthday are coalesced, the last one wins. Changes which couldn't be saved
+    are kept for the next flush."""
+
+    def __init__(self, interval, batch_size):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.flushes = 0
+        self.written = 0
+        self.failures = 0
+        self._birthdays = {}  # (person id, guild id) -> birthday, None to delete it
+        self._guilds = set()  # ids of guilds whose settings are deleted
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='write-buffer', daemon=True)
+        self._thread.start()
+
+    def set_birthday(self, person_id, guild_id, birthday):
+        """Saves the birthday with the next flush, None deletes it."""
+        with self._lock:
+            self._birthdays[(person_id, guild_id)] = birthday
+            full = len(self._birthdays) + len(self._guilds) >= self.batch_size
+        if full:
+            self.flush()
+
+    def delete_guild(self, guild_id):
+        """Deletes the settings of the guild with the next flush."""
+        with self._lock:
+            self._guilds.add(guild_id)
+            full = len(self._birthdays) + len(self._guilds) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Saves all pending changes in a single transaction. Returns False if they couldn't be saved."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._birthdays and not self._guilds:
+                    return True
+                birthdays, self._birthdays = self._birthdays, {}
+                guilds, self._guilds = self._guilds, set()
+
+            try:
+                written = write_changes(birthdays, guilds)
+            except STORAGE.Error as error:
+                print('Something went wrong:', error)
+                written = False
+            if written:
+                self.flushes += 1
+                self.written += len(birthdays) + len(guilds)
+                return True
+
+            # Keep the changes, newer ones win #
+            self.failures += 1
+            with self._lock:
+                birthdays.update(self._birthdays)
+                self._birthdays = birthdays
+                self._guilds |= guilds
+            return False
+
+    def stop(self):
+        """Stops the periodic flushes and saves the pending changes."""
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+
+    def stats(self):
+        """Returns the number of pending changes, flushes, saved changes and failed flushes."""
+        with self._lock:
+            pending = len(self._birthdays) + len(self._guilds)
+        return {'pending': pending, 'flushes': self.flushes, 'written': self.written, 'failures': self.failures}
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+
+def get_pool_stats():
+    """Returns the connection counters of the storage backend, e.g. the hits, misses and waits of the pool."""
+    if STORAGE is None:
+        return None
+    return STORAGE.stats()
 
-DATABASE = None
-USERNAME = None
-PASSWORD = None
-HOST = None
-PORT = None
 
-TABLE_NAME_DATA = 'birthday'
-COLUMN_PERSON_ID = 'person_id'
-COLUMN_BIRTHDAY = 'birthday'
-COLUMN_GUILD_ID = 'guild_id'
-TABLE_NAME_SETTINGS = 'greeting_channel'
-COLUMN_CHANNEL_ID = 'channel_id'
-COLUMN_LIST_MSG_ID = 'list_msg_id'
-COLUMN_lIST_MSG_CH_ID = 'list_msg_ch_id'
+def get_calendar_stats():
+    """Returns the hit, miss and eviction counters of the birthday calendar."""
+    return CALENDAR.stats()
 
 
-def connect():
-    """Establishes the connection to the database."""
-    try:
-        return psycopg2.connect(
-            user=USERNAME,
-            password=PASSWORD,
-            host=HOST,
-            port=PORT,
-            database=DATABASE
-        )
-    except (Exception, psycopg2.Error) as error:
-        print('Something went wrong:', error)
+def get_buffer_stats():
+    """Returns the pending changes and the flush counters of the write buffer."""
+    if BUFFER is None:
         return None
+    return BUFFER.stats()
 
 
-def disconnect(connection):
-    """Closes the connection to the database."""
-    if connection:
-        connection.close()
+def startup(name, user, password, host, port, pool_min=1, pool_max=10, calendar_size=100000,
+            flush_interval=0.2, flush_size=500, backend='postgresql', sqlite_path=None):
+    """Connects to the storage backend and creates the database tables if not already existing.
+    The backend is either 'postgresql', which uses the login credentials and the connection pool,
+    or 'sqlite', which uses the database file at sqlite_path.
+    Returns True if database was set up successfully, False otherwise."""
+    global STORAGE, CALENDAR, BUFFER
+    CALENDAR = calendar_util.BirthdayCalendar(max_entries=calendar_size)
 
+    # Only the driver of the chosen backend is imported #
+    try:
+        if backend == 'sqlite':
+            from discord_birthday_bot import sqlite_util
+            STORAGE = sqlite_util.SqliteStorage(sqlite_path)
+        elif backend == 'postgresql':
+            from discord_birthday_bot import postgres_util
+            STORAGE = postgres_util.PostgresStorage(name, user, password, host, port, pool_min, pool_max)
+        else:
+            print('Error: Unknown database backend %s, expected one of %s.'
+                  % (backend, ', '.join(storage_util.BACKENDS)))
+            return False
+    except Exception as error:
+        print('Something went wrong:', error)
+        return False
 
-def startup(name, user, password, host, port):
-    """Saves the login credentials and creates the database table if not already existing.
-    Returns True if database was set up successfully, False otherwise."""
-    global DATABASE, USERNAME, PASSWORD, HOST, PORT
-    DATABASE = name
-    USERNAME = user
-    PASSWORD = password
-    HOST = host
-    PORT = port
-
-    connection = connect()
-    if connection is not None:
-        # Add new column on update from 0.1.x #
-        query = f'ALTER TABLE IF EXISTS {TABLE_NAME_SETTINGS} ' \
-                f'ADD COLUMN IF NOT EXISTS {COLUMN_LIST_MSG_ID} BIGINT, ' \
-                f'ADD COLUMN IF NOT EXISTS {COLUMN_lIST_MSG_CH_ID} BIGINT; '
-
-        # Create tables #
-        query += f'CREATE TABLE IF NOT EXISTS {TABLE_NAME_DATA}' \
-                 f'({COLUMN_PERSON_ID} BIGINT NOT NULL, ' \
-                 f'{COLUMN_BIRTHDAY} DATE, ' \
-                 f'{COLUMN_GUILD_ID} BIGINT, ' \
-                 f'PRIMARY KEY ({COLUMN_PERSON_ID}, {COLUMN_GUILD_ID}));'
-        query += f'CREATE TABLE IF NOT EXISTS {TABLE_NAME_SETTINGS}' \
-                 f'({COLUMN_GUILD_ID} BIGINT PRIMARY KEY NOT NULL, ' \
-                 f'{COLUMN_CHANNEL_ID} BIGINT, ' \
-                 f'{COLUMN_LIST_MSG_ID} BIGINT, ' \
-                 f'{COLUMN_lIST_MSG_CH_ID} BIGINT);'
-
-        connection.cursor().execute(query)
-        connection.commit()
-        disconnect(connection)
-        return True
-    else:
+    if not STORAGE.create_tables():
         return False
+    BUFFER = WriteBuffer(flush_interval, flush_size)
+    STORAGE.before_borrow = BUFFER.flush  # every query sees the buffered writes and no write overtakes them
+    return True
 
 
-def insert(person):
-    """Saves a person to the database. Returns True when successfully saved, False otherwise."""
-    connection = connect()
-    if connection is not None:
-        query = f'INSERT INTO {TABLE_NAME_DATA} VALUES (%s, %s, %s) ' \
-                f'ON CONFLICT ({COLUMN_PERSON_ID}, {COLUMN_GUILD_ID}) DO UPDATE ' \
-                f'SET {COLUMN_BIRTHDAY} = %s;'
-        connection.cursor().execute(query, (person.person_id, person.birthday, person.guild_id, person.birthday))
-        connection.commit()
-        disconnect(connection)
-        print(f'Guild {person.guild_id}: '
-              f'Added member {person.person_id} with birthday '
-              + date_util.parse_to_string(person.birthday) + '.')
-        return True
-    else:
+def queue_insert(person):
+    """Saves a person with the next flush of the write buffer. The birthday is visible to all reads right away.
+    Returns False if the person is known to have this birthday already, True otherwise."""
+    if not CALENDAR.set_birthday(person.guild_id, person.person_id, person.birthday):
         return False
+    BUFFER.set_birthday(person.person_id, person.guild_id, person.birthday)
+    print(f'Guild {person.guild_id}: '
+          f'Added member {person.person_id} with birthday '
+          + date_util.parse_to_string(person.birthday) + '.')
+    return True
 
 
-def delete(person):
-    """Deletes a person and its birthday. Returns True when successfully saved, False otherwise."""
-    connection = connect()
-    if connection is not None:
-        query = f'DELETE FROM {TABLE_NAME_DATA} ' \
-                f'WHERE {COLUMN_PERSON_ID} = %s ' \
-                f'AND {COLUMN_GUILD_ID} = %s;'
-        cursor = connection.cursor()
-        cursor.execute(query, (person.person_id, person.guild_id))
-        connection.commit()
-        disconnect(connection)
-        return True
-    else:
+def queue_delete(person):
+    """Deletes a person with the next flush of the write buffer. The deletion is visible to all reads right away.
+    Returns False if the person is known to have no birthday, True otherwise."""
+    if not CALENDAR.remove_person(person.guild_id, person.person_id):
         return False
+    BUFFER.set_birthday(person.person_id, person.guild_id, None)
+    return True
 
 
-def delete_all(guild_id):
-    connection = connect()
-    if connection is not None:
-        query = f'DELETE FROM {TABLE_NAME_DATA} ' \
-                f'WHERE {COLUMN_GUILD_ID} = %s;'
-        cursor = connection.cursor()
-        cursor.execute(query, (guild_id,))
-        connection.commit()
-        disconnect(connection)
-        return True
-    else:
-        return False
+def queue_delete_guild(guild_id):
+    """Deletes the guild in the greeting_channel table with the next flush of the write buffer."""
+    BUFFER.delete_guild(guild_id)
+    return True
 
 
-def get_birthday_children():
-    """Getting all birthday children from the database and calculates their age."""
-    connection = connect()
-    if connection is not None:
-        query = f'SELECT d.{COLUMN_PERSON_ID}, DATE_PART(\'year\', AGE({COLUMN_BIRTHDAY})), c.{COLUMN_CHANNEL_ID} ' \
-                f'FROM {TABLE_NAME_DATA} AS d, {TABLE_NAME_SETTINGS} AS c ' \
-                f'WHERE DATE_PART(\'month\', {COLUMN_BIRTHDAY}) = DATE_PART(\'month\', CURRENT_DATE) ' \
-                f'AND DATE_PART(\'day\', {COLUMN_BIRTHDAY}) = DATE_PART(\'day\', CURRENT_DATE) ' \
-                f'AND d.{COLUMN_GUILD_ID} = c.{COLUMN_GUILD_ID} ' \
-                f'ORDER BY c.{COLUMN_CHANNEL_ID};'
-        cursor = connection.cursor()
-        cursor.execute(query)
-        birthday_children = cursor.fetchall()
-        disconnect(connection)
-        return birthday_children
-    else:
-        return None
+@metrics_util.timed('database')
+def write_changes(birthdays, guild_ids):
+    """Saves the changes of the write buffer in a single transaction.
+    birthdays maps (person id, guild id) to the birthday or None to delete it."""
+    inserts = [(person_id, birthday, guild_id)
+               for (person_id, guild_id), birthday in birthdays.items() if birthday is not None]
+    deletes = [key for key, birthday in birthdays.items() if birthday is None]
+    return STORAGE.write_changes(inserts, deletes, guild_ids)
 
 
-def list_all(guild_id):
-    """Returns all birthday entries."""
-    connection = connect()
-    if connection is not None:
-        query = f'SELECT {COLUMN_PERSON_ID}, {COLUMN_BIRTHDAY} ' \
-                f'FROM {TABLE_NAME_DATA} ' \
-                f'WHERE {COLUMN_GUILD_ID} = \'{guild_id}\' ' \
-                f'ORDER BY TO_CHAR({COLUMN_BIRTHDAY}, \'MMDD\');'
-        cursor = connection.cursor()
-        cursor.execute(query)
-        persons = cursor.fetchall()
-        disconnect(connection)
-        return persons
-    else:
+@metrics_util.timed('database')
+def delete(person):
+    """Deletes a person and its birthday. Returns the number of deleted rows, i.e. 0 if no birthday was saved,
+    or None if the database is not available."""
+    rowcount = STORAGE.delete(person.person_id, person.guild_id)
+    if rowcount:
+        CALENDAR.remove_person(person.guild_id, person.person_id)
+    return rowcount
+
+
+@metrics_util.timed('database')
+def delete_all(guild_id):
+    """Deletes all birthdays of the guild."""
+    if not STORAGE.delete_all(guild_id):
+        return False
+    CALENDAR.clear_guild(guild_id)
+    return True
+
+
+@metrics_util.timed('database')
+def prune_members(guild_id, member_ids):
+    """Deletes the birthdays of all persons of the guild who are not among the given members.
+    The sorted member ids are processed in chunks, each one covering a range of ids, so the arrays stay small
+    even for large guilds. Returns the number of deleted birthdays, None if the database is not available."""
+    member_ids = sorted(member_ids)
+    ranges = []
+    lower = 0
+    for start in range(0, max(1, len(member_ids)), PRUNE_CHUNK_SIZE):
+        chunk = member_ids[start:start + PRUNE_CHUNK_SIZE]
+        upper = chunk[-1] if start + PRUNE_CHUNK_SIZE < len(member_ids) else MAX_ID
+        ranges.append((lower, upper, chunk))
+        lower = upper
+
+    deleted = STORAGE.prune_members(guild_id, ranges)
+    if deleted:
+        CALENDAR.invalidate_guild(guild_id)
+    return deleted
+
+
+def iter_guild_birthday_children(guild_id, day, chunk_size=SWEEP_CHUNK_SIZE):
+    """Yields the birthday children of the guild on the given day with their age
+    as lists of at most chunk_size (person id, age), ordered by the person.
+    Every chunk is read by a short query continuing after the last person, so the children never have to fit into
+    memory at once and no connection is held while the caller processes a chunk.
+    Yields None and stops if the database is not available."""
+    month_day = date_util.get_month_day(day)
+    entries = CALENDAR.get_guild_range(guild_id, month_day, month_day)
+    if entries is not None:
+        for i in range(0, len(entries), chunk_size):
+            yield [(entry.person_id, date_util.get_age(entry.year, month_day, day))
+                   for entry in entries[i:i + chunk_size]]
+        return
+
+    after = 0
+    while True:
+        rows = load_guild_day(guild_id, month_day, after, chunk_size)
+        if rows is None:
+            yield None
+            return
+        if rows:
+            yield [(person_id, date_util.get_age(year, month_day, day)) for person_id, year in rows]
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1][0]
+
+
+@metrics_util.timed('database')
+def load_guild_day(guild_id, month_day, after, limit):
+    """Loads the next birthday children of the guild on the month-day after the given person."""
+    return STORAGE.load_guild_day(guild_id, month_day, after, limit)
+
+
+def to_entries(rows):
+    """Turns the (month-day, person id, birth year) rows of the database into calendar entries."""
+    if rows is None:
         return None
+    return [calendar_util.Entry._make(row) for row in rows]
 
 
-def get_list_msg_id(guild_id):
-    """Saves the list message id."""
-    connection = connect()
-    if connection is not None:
-        query = f'SELECT {COLUMN_lIST_MSG_CH_ID}, {COLUMN_LIST_MSG_ID} ' \
-                f'FROM {TABLE_NAME_SETTINGS} ' \
-                f'WHERE {COLUMN_GUILD_ID} = %s;'
-        cursor = connection.cursor()
-        cursor.execute(query, (guild_id,))
-        msg_id = cursor.fetchall()
-        disconnect(connection)
-        return msg_id
+@metrics_util.timed('database')
+def list_all(guild_id):
+    """Returns all birthday entries as Entry(month-day, person id, birth year) ordered by month and day."""
+    entries = CALENDAR.get_guild(guild_id)
+    if entries is None:
+        version = CALENDAR.version()
+        entries = load_guild(guild_id)
+        if entries is not None:
+            CALENDAR.put_guild(guild_id, entries, version)
+    return entries
+
+
+@metrics_util.timed('database')
+def load_guild(guild_id):
+    """Loads all birthday entries of the guild from the database."""
+    return to_entries(STORAGE.load_guild(guild_id))
+
+
+@metrics_util.timed('database')
+def get_upcoming(guild_id, day, days, limit=None):
+    """Returns the birthdays of the guild celebrated within the given number of days starting at the given day
+    as (date of the celebration, entry), ordered by the date of the celebration.
+    Only the month-day ranges of these days are read, either from the calendar or by an index range scan,
+    split in two at the end of the year. Returns None if the database is not available."""
+    days = max(1, min(days, 366))
+    dates = {}  # month-day -> date of the celebration, February 29th is only celebrated in leap years
+    for offset in range(days):
+        celebration = day + timedelta(days=offset)
+        dates.setdefault(date_util.get_month_day(celebration), celebration)
+
+    first = date_util.get_month_day(day)
+    last = date_util.get_month_day(day + timedelta(days=days - 1))
+    if days == 366:
+        # The whole year starting at the day, the limit has to keep the next birthdays, not the first ones of the year #
+        ranges = [(first, 1231), (101, first - 1)] if first > 101 else [(101, 1231)]
+    elif first <= last:
+        ranges = [(first, last)]
     else:
+        ranges = [(first, 1231), (101, last)]
+
+    upcoming = []
+    for start, end in ranges:
+        entries = load_range(guild_id, start, end, limit)
+        if entries is None:
+            return None
+        for entry in entries:
+            celebration = dates.get(entry.month_day)
+            if celebration is not None:
+                upcoming.append((celebration, entry))
+    upcoming.sort(key=lambda row: row[0])
+    return upcoming[:limit]
+
+
+def load_range(guild_id, first, last, limit=None):
+    """Returns the entries of the guild between the two month-days, served by the calendar if possible."""
+    entries = CALENDAR.get_guild_range(guild_id, first, last)
+    if entries is not None:
+        return entries[:limit]
+    return to_entries(STORAGE.load_range(guild_id, first, last, limit))
+
+
+def iter_guild(guild_id):
+    """Yields the entries of the guild ordered by month and day, like list_all.
+    Uncached guilds are streamed from the database and put into the calendar afterwards, if they fit."""
+    entries = CALENDAR.get_guild(guild_id)
+    if entries is not None:
+        yield from entries
+        return
+
+    version = CALENDAR.version()
+    entries = []
+    for entry in map(calendar_util.Entry._make, STORAGE.iter_guild(guild_id)):
+        if entries is not None:
+            entries.append(entry)
+            if len(entries) > CALENDAR.max_entries:
+                entries = None  # too large to be cached anyway
+        yield entry
+    if entries is not None:
+        CALENDAR.put_guild(guild_id, entries, version)
+
+
+def iter_birthdays(guild_id=None):
+    """Yields (guild id, person id, birthday) of all birthdays or only of the given guild.
+    The rows are streamed, so even large tables don't need to fit into memory."""
+    return STORAGE.iter_birthdays(guild_id)
+
+
+@metrics_util.timed('database')
+def import_birthdays(chunks):
+    """Imports chunks of (line, person id, birthday, guild id) rows in a single transaction.
+    Existing birthdays are updated and the last line wins for duplicates. Returns the number of merged rows."""
+    result = STORAGE.import_birthdays(chunks)
+    if result is None:
         return None
+    merged, guild_ids = result
+    for guild_id in guild_ids:
+        CALENDAR.invalidate_guild(guild_id)
+    return merged
 
 
-def set_list_msg(guild_id, channel_id, msg_id):
-    """Saves the list message id."""
-    connection = connect()
-    if connection is not None:
-        query = f'INSERT INTO {TABLE_NAME_SETTINGS}({COLUMN_GUILD_ID}, {COLUMN_lIST_MSG_CH_ID}, {COLUMN_LIST_MSG_ID}) ' \
-                f'VALUES (%s, %s, %s) ' \
-                f'ON CONFLICT ({COLUMN_GUILD_ID}) DO UPDATE ' \
-                f'SET {COLUMN_LIST_MSG_ID} = {msg_id}, ' \
-                f'{COLUMN_lIST_MSG_CH_ID} = {channel_id};'
-        connection.cursor().execute(query, (guild_id, channel_id, msg_id))
-        connection.commit()
-        disconnect(connection)
-        return True
-    else:
-        return False
+@metrics_util.timed('database')
+def set_list_msg(guild_id, channel_id, msg_ids):
+    """Saves the channel id and the message ids of all pages of the list message."""
+    return STORAGE.set_list_msg(guild_id, channel_id, msg_ids)
 
 
+@metrics_util.timed('database')
 def remove_list_msg(guild_id):
     """Removes the list message data from the given guild."""
-    connection = connect()
-    if connection is not None:
-        query = f'UPDATE {TABLE_NAME_SETTINGS} ' \
-                f'SET {COLUMN_LIST_MSG_ID} = NULL, ' \
-                f'{COLUMN_lIST_MSG_CH_ID} = NULL;'
-        connection.cursor().execute(query, (guild_id,))
-        connection.commit()
-        disconnect(connection)
-        return True
-    else:
-        return False
+    return STORAGE.remove_list_msg(guild_id)
 
 
+@metrics_util.timed('database')
 def set_channel(guild_id, channel_id):
     """Inserts an entry to the greeting_channel table."""
-    connection = connect()
-    if connection is not None:
-        query = f'INSERT INTO {TABLE_NAME_SETTINGS} VALUES (%s, %s) ' \
-                f'ON CONFLICT ({COLUMN_GUILD_ID}) DO UPDATE ' \
-                f'SET {COLUMN_CHANNEL_ID} = {channel_id};'
-        connection.cursor().execute(query, (guild_id, channel_id))
-        connection.commit()
-        disconnect(connection)
-        return True
-    else:
-        return False
+    return STORAGE.set_channel(guild_id, channel_id)
 
 
-def delete_guild(guild_id):
-    """Deletes an guild in the greeting_channel table"""
-    connection = connect()
-    if connection is not None:
-        query = f'DELETE FROM {TABLE_NAME_SETTINGS} ' \
-                f'WHERE guild_id = {guild_id};'
-        connection.cursor().execute(query)
-        connection.commit()
-        disconnect(connection)
-        return True
-    else:
-        return False
+@metrics_util.timed('database')
+def set_timezone(guild_id, timezone, hour):
+    """Saves the timezone and the hour at which the guild is greeted."""
+    return STORAGE.set_timezone(guild_id, timezone, hour)
+
+
+@metrics_util.timed('database')
+def set_language(guild_id, language):
+    """Saves the language of the guild, None for the default language."""
+    return STORAGE.set_language(guild_id, language)
+
+
+@metrics_util.timed('database')
+def get_languages():
+    """Returns (guild id, language) of all guilds with an own language."""
+    return STORAGE.get_languages()
+
+
+@metrics_util.timed('database')
+def set_digest(guild_id, weekday):
+    """Saves the weekday (0 is monday) of the weekly digest of upcoming birthdays, None disables it."""
+    return STORAGE.set_digest(guild_id, weekday)
+
+
+@metrics_util.timed('database')
+def claim_digest(guild_id, day):
+    """Marks the digest of the guild as sent on the given day.
+    Returns True if it wasn't sent on this day before, so only one replica sends it, and None on database errors."""
+    return STORAGE.claim_digest(guild_id, day)
+
+
+@metrics_util.timed('database')
+def get_greeting_settings(guild_id=None, shard_count=None, shard_ids=None):
+    """Returns (guild id, channel id, timezone, greeting hour, last greeting, digest weekday)
+    of all guilds with a greeting channel,
+    only of the given guild or only of the guilds of the given shards."""
+    return STORAGE.get_greeting_settings(guild_id, shard_count, shard_ids)
+
+
+@metrics_util.timed('database')
+def get_channel_settings(guild_id=None, shard_count=None, shard_ids=None):
+    """Returns (guild id, channel id, list message channel id, list message ids) of all guilds with settings,
+    only of the given guild or only of the guilds of the given shards."""
+    return STORAGE.get_channel_settings(guild_id, shard_count, shard_ids)
+
+
+@metrics_util.timed('database')
+def set_last_greeting(guild_id, day):
+    """Saves the day the guild was greeted the last time and removes its outdated greeting log."""
+    return STORAGE.set_last_greeting(guild_id, day, day - timedelta(days=GREETING_LOG_DAYS))
+
+
+@metrics_util.timed('database')
+def acquire_lease(name, owner, seconds):
+    """Acquires or renews the lease of the given name for the given number of seconds.
+    Returns True if the owner holds the lease, False if another owner holds it and None on database errors."""
+    return STORAGE.acquire_lease(name, owner, seconds)
+
+
+@metrics_util.timed('database')
+def claim_greetings(guild_id, day, person_ids, owner, timeout):
+    """Claims the greetings of the persons of the guild on the given day in the greeting log.
+    Greetings which were sent already or claimed less than timeout seconds ago can't be claimed again.
+    Returns the ids of the claimed persons and the ids of the persons greeted already,
+    None if the database is not available."""
+    return STORAGE.claim_greetings(guild_id, day, person_ids, owner, timeout)
+
+
+@metrics_util.timed('database')
+def set_greetings_sent(guild_id, day, person_ids):
+    """Marks the claimed greetings of the persons of the guild on the given day as sent."""
+    return STORAGE.set_greetings_sent(guild_id, day, person_ids)
+
+
+def shutdown():
+    """Saves the pending changes of the write buffer and closes all connections of the storage backend."""
+    global STORAGE, BUFFER
+    if BUFFER is not None:
+        BUFFER.stop()
+        BUFFER = None
+    if STORAGE is not None:
+        STORAGE.close()
+        STORAGE = None
@@ -1,46 +1,102 @@
-import locale
+import re
 from datetime import datetime
+from functools import lru_cache
 
-import dateparser
-from babel.dates import format_date, get_date_format
-
-from discord_birthday_bot import config_util as config
+from discord_birthday_bot import language_util
+from discord_birthday_bot import profile_util
 
 NO_YEAR = 1
 
-STANDARD_LANG = 'en_US'
-
-lang = config.get_language()
+FORMAT_CACHE_SIZE = 8192
 
-# Set locale #
-try:
-    locale.setlocale(locale.LC_ALL, lang + '.utf8')  # set locale
-except locale.Error:
-    print('Error: Locale %s not existing.' % lang)
-    lang = STANDARD_LANG
-    locale.setlocale(locale.LC_ALL, lang + '.utf8')
+# Common numeric formats which are parsed without dateparser #
+DAY_FIRST_PATTERN = re.compile(r'^(\d{1,2})\.(\d{1,2})\.(\d{4})?$')  # DD.MM. and DD.MM.YYYY
+ISO_PATTERN = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$')  # YYYY-MM-DD
+SLASH_PATTERN = re.compile(r'^(\d{1,2})/(\d{1,2})(?:/(\d{4}))?$')  # MM/DD(/YYYY) or DD/MM(/YYYY) by locale
 
 
 def get_current_locale():
-    """Returns the current locale string without the '.utf8'."""
-    return locale.getlocale(locale.LC_ALL)[0]
+    """Returns the locale of the current guild, e.g. de_DE."""
+    return language_util.current().code
 
 
 def parse_to_date(msg):
-    """Parses a date string and returns a datetime object."""
-    date = dateparser.parse(msg, locales=[get_current_locale()[:2]])  # parse date
+    """Parses a date string in the language of the current guild and returns a datetime object."""
+    language = language_util.current().parser_language
+    date = parse_numeric(msg.strip(), language)
+    if date is None:
+        import dateparser  # slow to load, so only imported when needed or by warm_up
+        date = dateparser.parse(msg, locales=[language])  # parse date
     # If is current year, set year to 1 #
-    if is_current_year(date):
+    if date is not None and is_current_year(date):
         date = date.replace(year=NO_YEAR)
     return date
 
 
+def parse_numeric(msg, language):
+    """Parses the common numeric date formats. Returns None if the format is unknown or the date is invalid."""
+    match = DAY_FIRST_PATTERN.match(msg)
+    if match:
+        day, month, year = match.groups()
+    else:
+        match = ISO_PATTERN.match(msg)
+        if match:
+            year, month, day = match.groups()
+        else:
+            match = SLASH_PATTERN.match(msg)
+            if not match:
+                return None
+            if language == 'en':
+                month, day, year = match.groups()
+            else:
+                day, month, year = match.groups()
+
+    try:
+        return datetime(int(year) if year else NO_YEAR, int(month), int(day))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_patterns(locale_name):
+    """Returns the long date format of the locale with and without the year."""
+    from babel.dates import get_date_format
+    pattern = get_date_format(format='long', locale=locale_name).pattern
+    return pattern, pattern.replace('y', '').replace(',', '').rstrip()
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def format_cached(year, month, day, locale_name):
+    """Formats the date according to the locale and the existence of the year."""
+    from babel.dates import format_date
+    with_year, without_year = get_patterns(locale_name)
+    date_format = with_year if year != NO_YEAR else without_year
+    return format_date(datetime(year, month, day), format=date_format, locale=locale_name)
+
+
 def parse_to_string(date):
-    """Formats the date according to the current locale and the existence of the year."""
-    date_format = get_date_format(format='long', locale=get_current_locale()).pattern
-    if not has_year(date):
-        date_format = date_format.replace('y', '').replace(',', '').rstrip()
-    return format_date(date, format=date_format, locale=get_current_locale())
+    """Formats the date according to the locale of the current guild and the existence of the year."""
+    return format_cached(date.year, date.month, date.day, get_current_locale())
+
+
+def format_weekday(weekday):
+    """Returns the name of the weekday (0 is Monday) in the language of the current guild."""
+    from babel.dates import get_day_names
+    return get_day_names('wide', locale=get_current_locale())[weekday]
+
+
+def format_month_day(year, month_day):
+    """Formats a birthday given by birth year and month-day like parse_to_string, without creating a date."""
+    return format_cached(year, month_day // 100, month_day % 100, get_current_locale())
+
+
+def warm_up():
+    """Loads dateparser and Babel and the date formats of all languages, so no command has to load them."""
+    profile_util.import_module('babel.dates')
+    profile_util.import_module('dateparser')
+    with profile_util.phase('load date formats'):
+        for locale_name in language_util.CATALOGS:
+            get_patterns(locale_name)
 
 
 def has_year(date):
@@ -53,6 +109,11 @@ def is_current_year(date):
     return date.year == datetime.now().year
 
 
+def get_month_day(date):
+    """Returns month and day of the date as sortable number, e.g. 1231 for December 31st."""
+    return date.month * 100 + date.day
+
+
 def has_birthday(person):
     """Returns if user has birthday"""
     today = datetime.today()
@@ -60,8 +121,6 @@ def has_birthday(person):
     return today.day == birthday.day and today.month == birthday.month
 
 
-def get_age(person):
-    """Gets age of person"""
-    today = datetime.today()
-    test = today.year - person.birthday.year - ((today.day, today.month) < (person.birthday.month, person.birthday.day))
-    return test
+def get_age(year, month_day, day):
+    """Gets the age at the given day of a person born at the month-day of the year"""
+    return day.year - year - (get_month_day(day) < month_day)
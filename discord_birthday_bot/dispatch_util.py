@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import aiohttp
+import discord
+
+from discord_birthday_bot import metrics_util
+
+QUEUE_SIZE = 1000
+WORKERS = 4
+MAX_RETRIES = 3
+RETRY_DELAY = 1  # seconds, doubled on every retry
+
+# Discord allows about 5 messages per 5 seconds per channel #
+BUCKET_CAPACITY = 5
+BUCKET_RATE = 1  # tokens per second
+
+
+class TokenBucket:
+    """Limits the rate of messages sent into one channel."""
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Dispatcher:
+    """Queue of outgoing messages which is processed by a few workers on the event loop of the bot.
+
+    Messages of the same channel are rate limited by a token bucket and failed sends are retried with backoff.
+    Other threads hand over their messages with submit_threadsafe, which blocks while the queue is full."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.buckets = {}
+        self.workers = [loop.create_task(self._work()) for _ in range(WORKERS)]
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    async def submit(self, channel, content, on_sent=None, on_failed=None):
+        """Queues a message from the event loop. The optional coroutine function on_sent is awaited once the message
+        was sent successfully, on_failed once sending failed for good."""
+        await self.queue.put((channel, content, time.monotonic(), on_sent, on_failed))
+
+    def submit_threadsafe(self, channel, content, on_sent=None, on_failed=None):
+        """Queues a message from another thread and waits until it is queued."""
+        asyncio.run_coroutine_threadsafe(self.submit(channel, content, on_sent, on_failed), self.loop).result()
+
+    def stats(self):
+        """Returns the queue depth, the send counters and the latency from queueing to sending in seconds."""
+        return {
+            'queued': self.queue.qsize(),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retries': self.retries,
+            'latency_avg': self.latency_total / self.sent if self.sent else 0.0,
+            'latency_max': self.latency_max
+        }
+
+    def close(self):
+        """Stops all workers. Messages still queued are dropped."""
+        for worker in self.workers:
+            worker.cancel()
+
+    async def _work(self):
+        while True:
+            channel, content, queued, on_sent, on_failed = await self.queue.get()
+            try:
+                await self._send(channel, content)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:  # a single message must never stop the worker
+                self.failed += 1
+                metrics_util.inc('dispatch_failed_total')
+                print('Could not send message to channel %s:' % channel.id, error)
+                callback = on_failed
+            else:
+                latency = time.monotonic() - queued
+                metrics_util.observe('dispatch_latency_seconds', latency)
+                self.sent += 1
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                callback = on_sent
+            finally:
+                self.queue.task_done()
+
+            if callback is not None:
+                try:
+                    await callback()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as error:
+                    self.failed += 1
+                    metrics_util.inc('dispatch_failed_total')
+                    print('Could not finish message to channel %s:' % channel.id, error)
+
+    async def _send(self, channel, content):
+        bucket = self.buckets.get(channel.id)
+        if bucket is None:
+            bucket = self.buckets[channel.id] = TokenBucket(BUCKET_CAPACITY, BUCKET_RATE)
+
+        delay = RETRY_DELAY
+        for attempt in range(MAX_RETRIES + 1):
+            await bucket.acquire()
+            metrics_util.inc('discord_api_calls_total', call='send')
+            try:
+                return await channel.send(content)
+            except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as error:
+                # Client errors like missing permissions won't go away by retrying #
+                client_error = isinstance(error, discord.HTTPException) and error.status < 500 and error.status != 429
+                if attempt == MAX_RETRIES or client_error:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(delay)
+                delay *= 2
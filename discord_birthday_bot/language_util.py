@@ -0,0 +1,55 @@
+import contextvars
+import gettext
+import os
+from types import MappingProxyType
+
+from discord_birthday_bot import config_util as config
+
+LOCALE_DIR = os.path.join(os.path.dirname(__file__), 'locale')
+DOMAIN = 'main'
+
+STANDARD_LANG = 'en_US'
+LANGUAGES = ('en_US', 'de_DE')  # the messages are written in English, all others need a catalog in LOCALE_DIR
+
+CATALOGS = MappingProxyType({})  # language code -> Language, replaced as a whole by load
+DEFAULT = None
+
+CURRENT = contextvars.ContextVar('language')
+
+
+class Language:
+    """Translations and date settings of one language. Loaded once by load and never changed afterwards."""
+    __slots__ = ('code', 'parser_language', 'gettext')
+
+    def __init__(self, code):
+        self.code = code
+        self.parser_language = code[:2]  # language of dateparser
+        self.gettext = gettext.translation(DOMAIN, localedir=LOCALE_DIR, languages=[code], fallback=True).gettext
+
+
+def load(default):
+    """Loads the catalogs of all languages and sets the default language of guilds without an own language."""
+    global CATALOGS, DEFAULT
+    if default not in LANGUAGES:
+        print('Error: Locale %s not existing.' % default)
+        default = STANDARD_LANG
+    CATALOGS = MappingProxyType({code: Language(code) for code in LANGUAGES})
+    DEFAULT = CATALOGS[default]
+
+
+def get(code):
+    """Returns the language of the given code or the default language if the code is None or unknown."""
+    return CATALOGS.get(code, DEFAULT)
+
+
+def use(code):
+    """Sets the language of the current task or thread, e.g. to the language of the guild a command came from."""
+    CURRENT.set(get(code))
+
+
+def current():
+    """Returns the language of the current task or thread."""
+    return CURRENT.get(DEFAULT)
+
+
+load(config.get_language())
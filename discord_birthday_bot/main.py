@@ -1,29 +1,65 @@
-import gettext
+from discord_birthday_bot import profile_util  # imported first to measure the startup
+
+import hashlib
+import io
+import itertools
 import os
+import socket
+import threading
+import uuid
+import asyncio
 from asyncio import TimeoutError
 import datetime
+import time
 
 import click
 import discord
-from apscheduler.schedulers.background import BackgroundScheduler
+import pytz
 from discord.ext import commands
 
+from discord_birthday_bot import async_database_util
 from discord_birthday_bot import config_util as config
 from discord_birthday_bot import database_util
 from discord_birthday_bot import date_util
+from discord_birthday_bot import dispatch_util
+from discord_birthday_bot import language_util
+from discord_birthday_bot import metrics_util
+from discord_birthday_bot import scheduler_util
+from discord_birthday_bot import storage_util
+from discord_birthday_bot import transfer_util
 from discord_birthday_bot.output_util import e_print
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
-LOCALE_DIR = os.path.join(os.path.dirname(__file__), 'locale')
-_ = gettext.gettext
+LIST_UPDATE_MAX_DELAY = 60  # seconds a list message update may be postponed at most
+MESSAGE_LIMIT = 2000  # characters per discord message
+MAX_REJECTED_LINES = 10  # rejected lines of an import which are listed in the reply
+LEASE_SECONDS = 300  # how long a replica stays the greeting leader of its shards after its last greeting
+CLAIM_TIMEOUT = 600  # seconds after which unsent greetings of a crashed replica are claimed again
+RECONCILE_DELAY = 0.1  # seconds between the member reconciliation of two guilds
+UPCOMING_DAYS = 7  # default days of the upcoming command and days of the weekly digest
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+REPLICA_ID = '%s-%s-%s' % (socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])  # owner of leases and claims
+
+bot = commands.AutoShardedBot(config.BOT_PREFIX[1] + ' ')  # init bot with standard prefix
 
-bot = commands.Bot(config.BOT_PREFIX[1] + ' ')  # init bot with standard prefix
+guild_languages = {}  # guild id -> language code of guilds with an own language
+guild_settings = {}  # guild id -> cached GuildSettings, filled in bulk as soon as the bot is ready
+list_msgs = {}  # guild id -> (channel, cached list messages, one per page)
+list_hashes = {}  # guild id -> hash of the content of the list message
+list_update_deadlines = {}  # guild id -> (first request, next edit) in loop time
+list_update_tasks = {}  # guild id -> pending update task
+list_update_stats = {'requested': 0, 'edits': 0, 'unchanged': 0, 'pages_edited': 0, 'pages_unchanged': 0}
+
+dispatcher = None  # queue of outgoing birthday messages, created as soon as the bot is ready
 
 
 class Person:
     """Represents a member on the discord with its id and birthday."""
 
+    __slots__ = ('person_id', 'birthday', 'guild_id')
+
     def __init__(self, person_id, birthday, guild_id):
         """Initializes a person with an id and its birthday."""
         self.person_id = person_id
@@ -31,6 +67,18 @@ class Person:
         self.guild_id = guild_id
 
 
+class GuildSettings:
+    """Greeting channel and list message of a guild, cached so they are read without a database round trip."""
+
+    __slots__ = ('channel_id', 'channel', 'list_channel_id', 'list_msg_ids')
+
+    def __init__(self, channel_id=None, list_channel_id=None, list_msg_ids=None):
+        self.channel_id = channel_id
+        self.channel = None  # resolved greeting channel, looked up on first use
+        self.list_channel_id = list_channel_id
+        self.list_msg_ids = list_msg_ids or []
+
+
 class Everyone(commands.Cog):
     @commands.command(name='set')
     async def save_date(self, ctx, date):
@@ -41,27 +89,47 @@ class Everyone(commands.Cog):
         if parsed_date is None:
             raise commands.BadArgument(date)
         elif date_util.has_birthday(person):
-            send_birthday_message(ctx.channel, person.person_id, date_util.get_age(person))
+            for page in get_birthday_messages(ctx.channel, [(person.person_id, get_person_age(person))]):
+                await dispatcher.submit(ctx.channel, page)
 
         # Insert into database #
-        database_util.insert(person)
+        changed = await async_database_util.queue_insert(person)
 
         # Send return message #
         date = date_util.parse_to_string(person.birthday)
         await send_message(_('Save the date! <@%s>\'s birthday is at the %s.')
                            % (person.person_id, date),
                            ctx.channel)
-        await update_list_message(ctx)  # Update birthday list
+        if changed:
+            schedule_list_update(ctx.guild)  # Update birthday list
 
     @commands.command(name='delete')
     async def delete_date(self, ctx):
         """Deletes the user's birthday."""
         person = Person(ctx.author.id, None, ctx.guild.id)
-        if database_util.delete(person):
+        deleted = await async_database_util.delete(person)
+        if deleted is not None:
             await send_message(_('<@%s>, I have forgotten your birthday. Do you even have one?')
                                % person.person_id,
                                ctx.channel)
-            await update_list_message(ctx)  # Update birthday list
+        if deleted:
+            schedule_list_update(ctx.guild)  # Update birthday list
+
+    @commands.command(name='upcoming')
+    async def upcoming(self, ctx, days=str(UPCOMING_DAYS)):
+        """Prints the birthdays of the next days (default 7)."""
+        if not days.isdecimal() or not 1 <= int(days) <= 366:
+            await send_message(_('Sorry, but \'%s\' isn\'t a number of days between 1 and 366.') % days, ctx.channel)
+            return
+        days = int(days)
+
+        upcoming = await async_database_util.get_upcoming(ctx.guild.id, datetime.date.today(), days)
+        if not upcoming:
+            await send_message(_('There are no birthdays in the next %s days.') % days, ctx.channel)
+            return
+        lines = [format_birthday(entry) for celebration, entry in upcoming]
+        for page in paginate([_('These are the birthdays of the next %s days:') % days] + lines):
+            await send_message(page, ctx.channel)
 
 
 class Admin(commands.Cog):
@@ -72,26 +140,95 @@ class Admin(commands.Cog):
 
         The list will be updated on each change. So a new birthday or deletion will update this message.
         """
-        # Write new message #
-        ret_msg = get_birthday_list(ctx.guild)
-        msg = await send_message(ret_msg, ctx.channel)
+        # Write new messages #
+        msgs = [await send_message(page, ctx.channel) for page in await get_birthday_list(ctx.guild)]
 
-        # Delete old message #
-        old_msg = await get_list_msg(ctx.guild)
-        if old_msg is not None:
-            await old_msg.delete()
+        # Delete old messages #
+        old_list = await get_list_msgs(ctx.guild)
+        if old_list is not None:
+            await delete_messages(old_list[1])
 
         # Update database
-        database_util.set_list_msg(ctx.guild.id, ctx.channel.id, msg.id)
+        await save_list_msg(ctx.guild, ctx.channel, msgs)
+        list_hashes[ctx.guild.id] = hash_pages(msg.content for msg in msgs)
 
     @commands.command(name='set-channel')
     @commands.has_permissions(administrator=True)
     async def set_channel(self, ctx):
         """Sets current channel for upcoming congratulations."""
-        database_util.set_channel(ctx.guild.id, ctx.channel.id)
+        await async_database_util.set_channel(ctx.guild.id, ctx.channel.id)
+        settings = guild_settings.get(ctx.guild.id)
+        if settings is not None:
+            settings.channel_id = ctx.channel.id
+            settings.channel = ctx.channel
+        await reschedule_guild(ctx.guild)
         ret_msg = _('Alright. All birthday greetings will be posted in this channel now.')
         await send_message(ret_msg, ctx.channel)
 
+    @commands.command(name='set-timezone')
+    @commands.has_permissions(administrator=True)
+    async def set_timezone(self, ctx, timezone, hour='0'):
+        """Sets the timezone (e.g. Europe/Berlin) and the hour (0-23) for upcoming congratulations."""
+        try:
+            pytz.timezone(timezone)
+        except pytz.UnknownTimeZoneError:
+            await send_message(_('Sorry, but \'%s\' isn\'t a timezone.') % timezone, ctx.channel)
+            return
+        if not hour.isdecimal() or not 0 <= int(hour) <= 23:
+            await send_message(_('Sorry, but \'%s\' isn\'t an hour of the day.') % hour, ctx.channel)
+            return
+        hour = int(hour)
+
+        await async_database_util.set_timezone(ctx.guild.id, timezone, hour)
+        await reschedule_guild(ctx.guild)
+        ret_msg = _('Alright. All birthday greetings will be posted at %s o\'clock (%s) now.') % (hour, timezone)
+        await send_message(ret_msg, ctx.channel)
+
+    @commands.command(name='set-digest')
+    @commands.has_permissions(administrator=True)
+    async def set_digest(self, ctx, weekday):
+        """Posts the birthdays of the coming week every week on the given day (e.g. monday) or stops it (off)."""
+        if weekday.lower() == 'off':
+            await async_database_util.set_digest(ctx.guild.id, None)
+            await reschedule_guild(ctx.guild)
+            await send_message(_('Alright. I won\'t post the birthdays of the coming week anymore.'), ctx.channel)
+            return
+
+        matches = [day for day in WEEKDAYS if len(weekday) >= 2 and day.startswith(weekday.lower())]
+        if len(matches) != 1:
+            await send_message(_('Sorry, but \'%s\' isn\'t a weekday.') % weekday, ctx.channel)
+            return
+
+        digest_weekday = WEEKDAYS.index(matches[0])
+        await async_database_util.set_digest(ctx.guild.id, digest_weekday)
+        await reschedule_guild(ctx.guild)
+        ret_msg = _('Alright. Every %s I will post the birthdays of the coming week in the greeting channel.') \
+            % date_util.format_weekday(digest_weekday)
+        await send_message(ret_msg, ctx.channel)
+
+    @commands.command(name='set-language')
+    @commands.has_permissions(administrator=True)
+    async def set_language(self, ctx, language):
+        """Sets the language of the bot on this server (e.g. de_DE) or resets it to the default (default)."""
+        if language.lower() == 'default':
+            code = None
+        else:
+            matches = [code for code in language_util.LANGUAGES if code.lower().startswith(language.lower())]
+            if not matches:
+                await send_message(_('Sorry, but I don\'t speak \'%s\'. I speak %s.')
+                                   % (language, ', '.join(language_util.LANGUAGES)), ctx.channel)
+                return
+            code = matches[0]
+
+        await async_database_util.set_language(ctx.guild.id, code)
+        if code is None:
+            guild_languages.pop(ctx.guild.id, None)
+        else:
+            guild_languages[ctx.guild.id] = code
+        language_util.use(code)
+        await send_message(_('Alright. I will talk in this language now.'), ctx.channel)
+        schedule_list_update(ctx.guild)  # Update birthday list
+
     @commands.command(name='delete-all')
     @commands.has_permissions(administrator=True)
     async def delete_all(self, ctx):
@@ -105,129 +242,602 @@ class Admin(commands.Cog):
             if await bot.wait_for('reaction_add',
                                   timeout=30.0,
                                   check=lambda reaction, user: user == ctx.author and reaction.emoji == '👍'):
-                database_util.delete_all(ctx.guild.id)
+                await async_database_util.delete_all(ctx.guild.id)
                 await send_message(_('I have forgotten all your birthdays. Tell me some!'), ctx.channel)
-                await update_list_message(ctx)  # Update birthday list
+                schedule_list_update(ctx.guild)  # Update birthday list
         except TimeoutError:
             await send_message(_('You didn\'t react in-time. I\'ll just forget about that.'), ctx.channel)
 
+    @commands.command(name='export')
+    @commands.has_permissions(administrator=True)
+    async def export_birthdays(self, ctx, fmt='csv'):
+        """Sends all saved birthdays as CSV or JSON file."""
+        if fmt not in transfer_util.FORMATS:
+            await send_message(_('Sorry, but \'%s\' isn\'t a supported format. Use csv or json.') % fmt, ctx.channel)
+            return
+
+        buffer = io.StringIO()
+        await async_database_util.run(transfer_util.export_birthdays, buffer, fmt, ctx.guild.id)
+        file = discord.File(io.BytesIO(buffer.getvalue().encode('utf-8')), filename='birthdays.' + fmt)
+        metrics_util.inc('discord_api_calls_total', call='send')
+        await ctx.channel.send(_('These are all birthdays I know:'), file=file)
+
+    @commands.command(name='import')
+    @commands.has_permissions(administrator=True)
+    async def import_birthdays(self, ctx):
+        """Imports all birthdays of the attached CSV or JSON file.
+
+        The file needs the columns person_id and birthday. Already saved birthdays are overwritten.
+        """
+        if not ctx.message.attachments:
+            await send_message(_('Please attach a CSV or JSON file with the birthdays.'), ctx.channel)
+            return
+
+        attachment = ctx.message.attachments[0]
+        try:
+            file = io.StringIO((await attachment.read()).decode('utf-8-sig'))
+            imported, rejected = await async_database_util.run(transfer_util.import_birthdays, file,
+                                                               transfer_util.guess_format(attachment.filename),
+                                                               ctx.guild.id)
+        except ValueError:
+            await send_message(_('Sorry, but I can\'t read this file.'), ctx.channel)
+            return
+        if imported is None:
+            raise commands.CommandError('Import failed, database not available.')
+
+        ret_msg = _('I have imported %s birthdays. %s lines were rejected.') % (imported, len(rejected))
+        if rejected:
+            ret_msg += '\n```\n' + '\n'.join('%s: %s' % line for line in rejected[:MAX_REJECTED_LINES]) + '\n```'
+        await send_message(ret_msg, ctx.channel)
+        schedule_list_update(ctx.guild)  # Update birthday list
+
+
+@bot.event
+async def on_message(message):
+    """Answers commands in the language of the guild they came from."""
+    language_util.use(get_guild_language(message.guild.id if message.guild else None))
+    await bot.process_commands(message)
+
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    """Remembers when the command was invoked."""
+    ctx.started = time.perf_counter()
+
+
+@bot.after_invoke
+async def stop_command_timer(ctx):
+    """Records how long the command took, even if it failed."""
+    seconds = time.perf_counter() - ctx.started
+    metrics_util.observe('command_seconds', seconds, command=ctx.command.qualified_name)
+    metrics_util.log('command', seconds, ctx.guild.id if ctx.guild else None, command=ctx.command.qualified_name)
+
 
 @bot.event
 async def on_command_error(ctx, error):
     """Handles all errors of incoming commands."""
+    language_util.use(get_guild_language(ctx.guild.id if ctx.guild else None))
     if isinstance(error, commands.CommandNotFound):
         ret_msg = _('Sorry, but this command does not exist. With `!bdg help` you can list all available commands.')
     elif isinstance(error, commands.MissingPermissions):
         ret_msg = _('Sorry, but you don\'t have the necessary permissions to use this command.')
     elif isinstance(error, commands.BadArgument):
-        ret_msg = _('Sry, but \'%s\' isn\'t a date.' % error.args[0])
+        ret_msg = _('Sry, but \'%s\' isn\'t a date.') % error.args[0]
     else:
         print(error)
         ret_msg = _('Sorry, but something went wrong. Please advise the administrator.')
     bot.loop.create_task(send_message(ret_msg, ctx.channel))
 
 
+@bot.event
+async def on_ready():
+    """Starts the scheduler once the bot is connected, so greetings missed while offline can be sent right away.
+    Afterwards the slow date modules are loaded in the background."""
+    global dispatcher
+    if dispatcher is not None:
+        return  # reconnected
+    dispatcher = dispatch_util.Dispatcher(bot.loop)
+    profile_util.record_since_start('time to ready')
+
+    # Only the guilds of the local shards are greeted by this process #
+    settings = await async_database_util.get_greeting_settings(shard_count=bot.shard_count, shard_ids=bot.shard_ids)
+    with profile_util.phase('load guild settings'):
+        await load_guild_settings()
+    with profile_util.phase('start scheduler'):
+        await bot.loop.run_in_executor(None, start_scheduler, settings)
+    await bot.loop.run_in_executor(None, date_util.warm_up)
+    profile_util.print_report()
+    await reconcile_members(bot.guilds)
+
+
+@bot.event
+async def on_guild_join(guild):
+    """Removes the birthdays of members who left while the bot wasn't part of the guild."""
+    await reconcile_members([guild])
+
+
 @bot.event
 async def on_guild_remove(guild):
     """Deletes guild if bot leaves it"""
-    database_util.delete_guild(guild_id=guild.id)
+    await async_database_util.queue_delete_guild(guild.id)
+    guild_settings.pop(guild.id, None)
+    list_msgs.pop(guild.id, None)
+    if scheduler_util.is_running():
+        scheduler_util.unschedule_guild(guild.id)
     print('The bot left %s' % guild.name)
 
 
 @bot.event
-async def on_member_remove(person):
-    """Deletes person if it leaves guild"""
-    database_util.delete(person)
+async def on_guild_channel_delete(channel):
+    """Drops the cached settings of the guild if its greeting or list message channel got deleted."""
+    settings = guild_settings.get(channel.guild.id)
+    if settings is not None and channel.id in (settings.channel_id, settings.list_channel_id):
+        del guild_settings[channel.guild.id]
+        list_msgs.pop(channel.guild.id, None)
 
 
-async def get_list_msg(guild):
-    """Returns the list message."""
-    res = database_util.get_list_msg_id(guild.id)
+@bot.event
+async def on_member_remove(member):
+    """Deletes person if it leaves guild"""
+    if await async_database_util.queue_delete(Person(member.id, None, member.guild.id)):
+        schedule_list_update(member.guild)
+
+
+async def reconcile_members(guilds):
+    """Deletes the birthdays of members who left the guilds while the bot was offline.
+    The guilds are reconciled one after another with a short pause, so the database isn't flooded after connecting."""
+    pruned = 0
+    for guild in guilds:
+        if not guild.chunked:
+            continue  # the member list is incomplete, so present members would be deleted
+        deleted = await async_database_util.prune_members(guild.id, [member.id for member in guild.members])
+        if deleted:
+            pruned += deleted
+            schedule_list_update(guild)
+        await asyncio.sleep(RECONCILE_DELAY)
+    print('Reconciled %s guilds, removed %s birthdays of members who left.' % (len(guilds), pruned))
+
+
+async def get_list_msgs(guild):
+    """Returns the channel and the messages of all pages of the list message.
+    The messages are only fetched once and cached afterwards. Deleted pages are left out.
+    Returns None if there is no list message or it could not be fetched, e.g. as discord is not available."""
+    if guild.id in list_msgs:
+        return list_msgs[guild.id]
+
+    settings = await get_guild_settings(guild.id)
 
     # Skip if nothing found #
-    if not res:
+    if settings is None:
         return None
 
-    ch_id = res[0][0]
-    msg_id = res[0][1]
+    ch_id = settings.list_channel_id
+    msg_ids = settings.list_msg_ids
 
     # Skip if no channel or message is defined #
-    if ch_id is None or msg_id is None:
+    if ch_id is None or not msg_ids:
         return None
 
-    try:
-        ch = bot.get_channel(ch_id)
-        msg = await ch.fetch_message(msg_id)
-        return msg
-    except (discord.NotFound, AttributeError):
-        # Remove list message data from database #
-        database_util.remove_list_msg(guild.id)
+    ch = bot.get_channel(ch_id)
+    msgs = []
+    for msg_id in msg_ids:
+        try:
+            metrics_util.inc('discord_api_calls_total', call='fetch')
+            msgs.append(await ch.fetch_message(msg_id))
+        except discord.NotFound:
+            pass
+        except (AttributeError, discord.Forbidden):  # channel was deleted or can't be read anymore
+            break
+        except discord.HTTPException as error:
+            print('Could not fetch the list message of guild %s:' % guild.id, error)
+            return None  # not cached, so the next update fetches again
+
+    if not msgs:
+        await forget_list_msg(guild)
         return None
-
-
-async def update_list_message(ctx):
-    """Updates the list message with the current data from the database."""
-    msg = await get_list_msg(ctx.guild)
-    if msg is not None:
-        await msg.edit(content=get_birthday_list(ctx.guild))
-
-
+    list_msgs[guild.id] = (ch, msgs)
+    return ch, msgs
+
+
+async def load_guild_settings():
+    """Caches the settings of all guilds of the local shards with a single query."""
+    rows = await async_database_util.get_channel_settings(shard_count=bot.shard_count, shard_ids=bot.shard_ids)
+    if rows is None:
+        return
+    for guild_id, channel_id, list_channel_id, list_msg_ids in rows:
+        guild_settings[guild_id] = GuildSettings(channel_id, list_channel_id, list_msg_ids)
+    for guild in bot.guilds:
+        guild_settings.setdefault(guild.id, GuildSettings())  # no settings saved
+
+
+async def get_guild_settings(guild_id):
+    """Returns the cached settings of the guild, loaded from the database if not cached.
+    Returns None if the database is not available."""
+    settings = guild_settings.get(guild_id)
+    if settings is None:
+        rows = await async_database_util.get_channel_settings(guild_id)
+        if rows is None:
+            return None
+        settings = guild_settings[guild_id] = GuildSettings(*rows[0][1:]) if rows else GuildSettings()
+    return settings
+
+
+def get_greeting_channel(guild_id, channel_id):
+    """Returns the greeting channel of the guild, resolved once and cached afterwards."""
+    settings = guild_settings.get(guild_id)
+    if settings is None or settings.channel_id != channel_id:
+        return bot.get_channel(channel_id)
+    if settings.channel is None:
+        settings.channel = bot.get_channel(channel_id)
+    return settings.channel
+
+
+async def save_list_msg(guild, channel, msgs):
+    """Saves the channel and the messages of all pages of the list message in the database and the caches.
+    Returns False if the database is not available."""
+    msg_ids = [msg.id for msg in msgs]
+    saved = await async_database_util.set_list_msg(guild.id, channel.id, msg_ids)
+    list_msgs[guild.id] = (channel, msgs)
+    settings = guild_settings.get(guild.id)
+    if settings is not None:
+        settings.list_channel_id = channel.id
+        settings.list_msg_ids = msg_ids
+    return saved
+
+
+async def delete_messages(msgs):
+    """Deletes the messages, ignoring those which are already gone."""
+    for msg in msgs:
+        try:
+            metrics_util.inc('discord_api_calls_total', call='delete')
+            await msg.delete()
+        except discord.NotFound:
+            pass
+
+
+async def forget_list_msg(guild):
+    """Removes the list message data from the cache and database."""
+    list_msgs.pop(guild.id, None)
+    list_hashes.pop(guild.id, None)
+    await async_database_util.remove_list_msg(guild.id)
+    settings = guild_settings.get(guild.id)
+    if settings is not None:
+        settings.list_channel_id = None
+        settings.list_msg_ids = []
+
+
+def schedule_list_update(guild):
+    """Marks the list message of the guild as outdated.
+
+    All changes are coalesced into a single edit, which happens as soon as the guild was quiet for the configured
+    delay, but at the latest LIST_UPDATE_MAX_DELAY seconds after the first change."""
+    list_update_stats['requested'] += 1
+    now = bot.loop.time()
+    first = list_update_deadlines.get(guild.id, (now,))[0]
+    list_update_deadlines[guild.id] = (first, min(now + config.get_list_update_delay(), first + LIST_UPDATE_MAX_DELAY))
+    if guild.id not in list_update_tasks:
+        list_update_tasks[guild.id] = bot.loop.create_task(flush_list_update(guild))
+
+
+async def flush_list_update(guild):
+    """Waits until the guild is quiet and updates its list message afterwards."""
+    try:
+        while True:
+            delay = list_update_deadlines[guild.id][1] - bot.loop.time()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+    finally:
+        # Changes arriving from now on schedule a new update #
+        del list_update_deadlines[guild.id]
+        del list_update_tasks[guild.id]
+    await update_list_message(guild)
+
+
+async def update_list_message(guild):
+    """Updates the list message with the current data from the database.
+    Nothing is fetched or edited if the content didn't change since the last update. Otherwise only pages whose
+    content changed are edited, missing pages are sent and superfluous ones are deleted."""
+    pages = await get_birthday_list(guild)
+    content_hash = hash_pages(pages)
+    if list_hashes.get(guild.id) == content_hash:
+        list_update_stats['unchanged'] += 1
+        return
+
+    list_msg = await get_list_msgs(guild)
+    if list_msg is None:
+        return
+    channel, msgs = list_msg
+    list_update_stats['edits'] += 1
+
+    new_msgs = msgs[:len(pages)]
+    try:
+        for msg, page in zip(msgs, pages):
+            if msg.content == page:
+                list_update_stats['pages_unchanged'] += 1
+                continue
+            metrics_util.inc('discord_api_calls_total', call='edit')
+            await msg.edit(content=page)
+            list_update_stats['pages_edited'] += 1
+        for page in pages[len(msgs):]:
+            new_msgs.append(await send_message(page, channel))
+        await delete_messages(msgs[len(pages):])
+    except (discord.NotFound, discord.Forbidden):
+        # The list message or the permission to update it is gone #
+        await forget_list_msg(guild)
+        return
+    except discord.HTTPException as error:
+        print('Could not update the list message of guild %s:' % guild.id, error)
+        if len(new_msgs) > len(msgs):
+            await save_list_msg(guild, channel, new_msgs)  # keep the pages sent so far
+        return
+
+    if len(pages) != len(msgs) and not await save_list_msg(guild, channel, new_msgs):
+        return
+    # Only remembered once every page is sent and saved, so a failed update is repeated by the next one #
+    list_hashes[guild.id] = content_hash
+
+
+def hash_pages(pages):
+    """Returns a short hash of the content of all pages of a list message."""
+    digest = hashlib.blake2b(digest_size=16)
+    for page in pages:
+        digest.update(page.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.digest()
+
+
+def get_list_update_stats():
+    """Returns how many list updates were requested, how many were made, how many were skipped as the content
+    didn't change and how many were saved in total."""
+    return dict(list_update_stats, saved=list_update_stats['requested'] - list_update_stats['edits'])
+
+
+@metrics_util.timed('discord')
 async def send_message(message, channel):
     """Sends a message into the given channel."""
+    metrics_util.inc('discord_api_calls_total', call='send')
     return await channel.send(message)
 
 
-def get_birthday_list(guild):
-    """Returns a list of all birthdays as string for posting at the discord server."""
-    birthday_list = database_util.list_all(guild.id)
-    if not birthday_list:
-        msg = _('I don\'t know any birthdays. Tell me some!')
-    else:
-        msg = _('These are all birthdays I know:') + '\n' + '\n'.join(
-            map(lambda m: '%s - <@%s>' % (date_util.parse_to_string(m[1]), m[0]), birthday_list))
-    return msg
-
-
-def on_birthday():
-    """Checks for the birthday children and sends a message."""
-    birthday_children = database_util.get_birthday_children()
-    for child in birthday_children:
-        channel = bot.get_channel(child[2])
-        send_birthday_message(channel, child[0], child[1])
-
-
-def send_birthday_message(channel, person_id, age):
-    """Sends birthday message"""
+async def get_birthday_list(guild):
+    """Returns the list of all birthdays for posting at the discord server, split into pages of one message each."""
+    return await async_database_util.run(render_birthday_list, guild.id)
+
+
+def render_birthday_list(guild_id):
+    """Renders the birthdays of the guild into pages. The lines are generated lazily while the birthdays are
+    streamed, so even large guilds are never held as one string."""
+    language_util.use(get_guild_language(guild_id))
+    lines = map(format_birthday, database_util.iter_guild(guild_id))
+    pages = paginate(itertools.chain([_('These are all birthdays I know:')], lines))
+    if len(pages) == 1 and '\n' not in pages[0]:
+        return [_('I don\'t know any birthdays. Tell me some!')]
+    return pages
+
+
+@metrics_util.timed('birthday_sweep')
+def on_birthday(guild_id, channel_id, tz, day=None):
+    """Checks for the birthday children of the guild at its local date and sends a message.
+    Retries pass the day they were scheduled for and are dropped once the local date has changed.
+
+    If several replicas run the same shards, only the one holding the lease of the shard greets. The others check
+    again once the lease could have expired. Every greeting is claimed in the greeting log before it is sent,
+    so nobody is greeted twice, and the day is only marked as greeted after all messages were sent,
+    so greetings interrupted by a crash are sent after the restart."""
+    if not is_local_guild(guild_id):
+        return
+    today = datetime.datetime.now(tz).date()
+    if day is not None and day != today:
+        return  # a retry of a past day, the greeting of today runs at the greeting hour
+    day = today
+    language_util.use(get_guild_language(guild_id))
+    settings = database_util.get_greeting_settings(guild_id)
+    if not settings or (settings[0][4] is not None and settings[0][4] >= day):
+        return  # no greeting channel anymore or already greeted
+
+    lease = 'sweep-%s' % get_shard_id(guild_id, bot.shard_count or 1)
+    if not database_util.acquire_lease(lease, REPLICA_ID, LEASE_SECONDS):
+        scheduler_util.retry_guild(guild_id, channel_id, tz, LEASE_SECONDS, day)
+        return
+
+    channel = get_greeting_channel(guild_id, channel_id)
+    if channel is None:
+        database_util.set_last_greeting(guild_id, day)
+        return
+
+    # The birthday children are streamed in chunks into the dispatcher, which blocks while its queue is full #
+    state = {'pending': 1, 'complete': True}  # pages not sent yet, plus one until all children are queued
+    lock = threading.Lock()
+    retry = False
+
+    async def release():
+        with lock:
+            state['pending'] -= 1
+            done = not state['pending']
+        if done and state['complete']:
+            await async_database_util.set_last_greeting(guild_id, day)
+
+    async def on_failed():
+        # The greetings of the page stay claimed but unsent, so they are claimed and sent again after the timeout #
+        scheduler_util.retry_guild(guild_id, channel_id, tz, CLAIM_TIMEOUT, day)
+
+    for birthday_children in database_util.iter_guild_birthday_children(guild_id, day):
+        if birthday_children is None:
+            state['complete'] = False
+            break
+        person_ids = [person_id for person_id, age in birthday_children]
+        claims = database_util.claim_greetings(guild_id, day, person_ids, REPLICA_ID, CLAIM_TIMEOUT)
+        if claims is None:
+            state['complete'] = False
+            break
+        claimed, sent = claims
+        if len(claimed) + len(sent) < len(birthday_children):
+            # Only greetings another replica still holds keep the day open, sent ones are done #
+            state['complete'] = False
+            retry = True
+        if claimed:
+            claimed_ids = set(claimed)
+            pages = get_birthday_pages(channel, [child for child in birthday_children if child[0] in claimed_ids])
+            with lock:
+                state['pending'] += len(pages)
+            for page, page_ids in pages:
+                dispatcher.submit_threadsafe(channel, page, get_on_sent(guild_id, day, page_ids, release), on_failed)
+
+    if retry:
+        # Greetings claimed by another replica are claimed again if they are not sent in time #
+        scheduler_util.retry_guild(guild_id, channel_id, tz, CLAIM_TIMEOUT, day)
+    asyncio.run_coroutine_threadsafe(release(), bot.loop).result()
+
+
+def get_on_sent(guild_id, day, person_ids, release):
+    """Returns the callback of the dispatcher for one page of greetings.
+    Once the page was sent the greetings of its persons are marked as sent, then the page is released."""
+
+    async def on_sent():
+        await async_database_util.set_greetings_sent(guild_id, day, person_ids)
+        await release()
+
+    return on_sent
+
+
+@metrics_util.timed('digest')
+def on_digest(guild_id, channel_id, tz):
+    """Posts the birthdays of the coming week. Of several replicas only the first one claiming the digest posts it."""
+    channel = get_greeting_channel(guild_id, channel_id)
+    if not is_local_guild(guild_id) or channel is None:
+        return
+    language_util.use(get_guild_language(guild_id))
+    day = datetime.datetime.now(tz).date()
+    if not database_util.claim_digest(guild_id, day):
+        return
+
+    upcoming = database_util.get_upcoming(guild_id, day, UPCOMING_DAYS)
+    if upcoming:
+        lines = [format_birthday(entry) for celebration, entry in upcoming]
+        for page in paginate([_('These are the birthdays of the coming week:')] + lines):
+            dispatcher.submit_threadsafe(channel, page)
+
+
+def _(message):
+    """Translates the message into the language of the current guild."""
+    return language_util.current().gettext(message)
+
+
+def get_guild_language(guild_id):
+    """Returns the language code of the guild, None for the default language."""
+    return guild_languages.get(guild_id)
+
+
+def format_birthday(entry):
+    """Returns the line of a birthday entry in the birthday list."""
+    return '%s - <@%s>' % (date_util.format_month_day(entry.year, entry.month_day), entry.person_id)
+
+
+def get_person_age(person):
+    """Returns the age of the person today."""
+    return date_util.get_age(person.birthday.year, date_util.get_month_day(person.birthday), datetime.date.today())
+
+
+def get_birthday_messages(channel, birthday_children):
+    """Returns one combined birthday message for all birthday children of the channel,
+    split into several messages if it is too long."""
     # Ping everyone if permission is granted #
     if channel.guild.me.permissions_in(channel).mention_everyone:
-        msg = '@everyone '
-    else:
-        msg = ''
-
-    # Create message depending if the birthday contains a year #
-    if age < 2000:
-        msg += _('Let\'s party! <@%s> is now %s years old!') % (person_id, int(age))
+        prefix = '@everyone '
     else:
-        msg += _('Let\'s party! It\'s <@%s> birthday today!') % person_id
-
-    bot.loop.create_task(send_message(msg, channel))
+        prefix = ''
+
+    lines = []
+    for person_id, age in birthday_children:
+        # Create message depending if the birthday contains a year #
+        if age < 2000:
+            lines.append(_('Let\'s party! <@%s> is now %s years old!') % (person_id, int(age)))
+        else:
+            lines.append(_('Let\'s party! It\'s <@%s> birthday today!') % person_id)
+    return [prefix + page for page in paginate(lines, MESSAGE_LIMIT - len(prefix))]
+
+
+def get_birthday_pages(channel, birthday_children):
+    """Returns the messages of get_birthday_messages, each one with the ids of the persons it greets."""
+    person_ids = [person_id for person_id, age in birthday_children]
+    pages = []
+    start = 0
+    for page in get_birthday_messages(channel, birthday_children):
+        end = start + page.count('\n') + 1  # one line per person
+        pages.append((page, person_ids[start:end]))
+        start = end
+    return pages
+
+
+def paginate(lines, limit=MESSAGE_LIMIT):
+    """Packs the lines into as few pages as possible, each one at most limit characters long."""
+    pages = []
+    page = ''
+    for line in lines:
+        if page and len(page) + 1 + len(line) > limit:
+            pages.append(page)
+            page = ''
+        page = page + '\n' + line if page else line
+    if page:
+        pages.append(page)
+    return pages
+
+
+def collect_metrics():
+    """Returns the current pool, cache, list update and dispatcher counters as gauges for the metrics endpoint."""
+    gauges = {}
+    sources = [('db_pool', database_util.get_pool_stats()), ('calendar', database_util.get_calendar_stats()),
+               ('list_updates', get_list_update_stats()), ('write_buffer', database_util.get_buffer_stats())]
+    if dispatcher is not None:
+        sources.append(('dispatch', dispatcher.stats()))
+    for prefix, stats in sources:
+        for name, value in (stats or {}).items():
+            gauges['%s_%s' % (prefix, name)] = value
+    return gauges
+
+
+def get_shard_id(guild_id, shard_count):
+    """Returns the shard of the guild, see https://discord.com/developers/docs/topics/gateway#sharding."""
+    return (guild_id >> 22) % shard_count
+
+
+def is_local_guild(guild_id):
+    """Returns whether the guild belongs to one of the shards run by this process."""
+    if bot.shard_ids is None or not bot.shard_count:
+        return True
+    return get_shard_id(guild_id, bot.shard_count) in bot.shard_ids
+
+
+def parse_shard_ids(ctx, param, value):
+    """Parses comma separated shard ids and ranges like 0-3,8 into a list. Empty for all shards."""
+    if not value:
+        return None
+    shard_ids = []
+    try:
+        for part in value.split(','):
+            first, _sep, last = part.partition('-')
+            shard_ids += range(int(first), int(last or first) + 1)
+    except ValueError:
+        raise click.BadParameter('expected shard ids like 0-3,8')
+    return shard_ids
 
 
-def start_scheduler():
-    """Configures and starts the scheduler."""
-    scheduler = BackgroundScheduler(daemon=True)
-    scheduler.add_job(on_birthday, 'cron', day='*')
-    scheduler.start()
+def start_scheduler(settings):
+    """Configures and starts the scheduler with the greeting settings of all guilds."""
+    scheduler_util.start(on_birthday, config.get_greeting_spread(), on_digest)
+    for guild_id, channel_id, timezone, hour, last_greeting, digest_weekday in settings or []:
+        scheduler_util.schedule_guild(guild_id, channel_id, timezone, hour, last_greeting, digest_weekday, catch_up=True)
 
 
-def set_language(lang):
-    global _
-    trans = gettext.translation('main', localedir=LOCALE_DIR, languages=[lang], fallback=True)
-    trans.install()
-    _ = trans.gettext
+async def reschedule_guild(guild):
+    """Applies changed greeting settings of the guild to the scheduler."""
+    settings = await async_database_util.get_greeting_settings(guild.id)
+    if settings and scheduler_util.is_running():
+        scheduler_util.schedule_guild(*settings[0])
 
 
-@click.command(context_settings=CONTEXT_SETTINGS)
+@click.group(context_settings=CONTEXT_SETTINGS, invoke_without_command=True)
 @click.option('--token', '-t', default=config.get_token(), help='Token of the bot account')
 @click.option('--prefix', '-b', default=config.get_prefix(), help='Prefix for bot commands')
 @click.option('--space-after-prefix', '-a', default=config.is_space_after_prefix(),
@@ -237,28 +847,118 @@ def set_language(lang):
 @click.option('--password', '-s', default=config.get_db_password(), help='Password to enter database')
 @click.option('--host', '-a', default=config.get_db_host(), help='URL of the database')
 @click.option('--port', '-p', default=config.get_db_port(), help='Port of the database')
-@click.option('--language', '-l', default=config.get_language(), help='Language in which the bot shall talk')
-def start(token, prefix, space_after_prefix, name, user, password, host, port, language):
-    """Log into discord and listens for any command on all channels on all servers the bot was added to."""
-
-    set_language(language)
+@click.option('--backend', default=config.get_storage_backend(), type=click.Choice(storage_util.BACKENDS),
+              help='Database the birthdays are stored in, SQLite needs no server but only a single process')
+@click.option('--sqlite-path', default=config.get_sqlite_path(), help='Database file of the SQLite backend')
+@click.option('--language', '-l', default=config.get_language(),
+              help='Language in which the bot shall talk on servers without an own language')
+@click.option('--profile-startup', is_flag=True,
+              help='Prints how long the startup, its phases and the slowest imports took')
+@click.option('--shard-count', type=int, default=config.get_shard_count(),
+              help='Total number of shards of all processes, recommended by discord by default')
+@click.option('--shard-ids', default=config.get_shard_ids(), callback=parse_shard_ids,
+              help='Shards run by this process like 0-3,8, all by default')
+@click.pass_context
+def start(ctx, token, prefix, space_after_prefix, name, user, password, host, port, backend, sqlite_path, language,
+          profile_startup, shard_count, shard_ids):
+    """Log into discord and listens for any command on all channels on all servers the bot was added to.
+
+    Large bots can be split into several processes, each one running a part of the shards,
+    e.g. --shard-count 4 --shard-ids 0-1 and --shard-count 4 --shard-ids 2-3.
+
+    The commands export and import the birthdays instead of starting the bot."""
+    profile_util.record_since_start('time to import main')
+    profile_util.stop_import_timing()
+    if profile_startup:
+        profile_util.enable()
+
+    if shard_ids is not None:
+        if shard_count is None:
+            raise click.BadParameter('is required if shard ids are given', param_hint='--shard-count')
+        if max(shard_ids) >= shard_count:
+            raise click.BadParameter('must be lower than the shard count', param_hint='--shard-ids')
+
+    language_util.load(language)
+
+    with profile_util.phase('database startup'):
+        database_ready = database_util.startup(name, user, password, host, port,
+                                               pool_min=config.get_db_pool_min(), pool_max=config.get_db_pool_max(),
+                                               calendar_size=config.get_calendar_size(),
+                                               flush_interval=config.get_db_flush_interval(),
+                                               flush_size=config.get_db_flush_size(),
+                                               backend=backend, sqlite_path=sqlite_path)
+    if ctx.invoked_subcommand is not None:
+        if not database_ready:
+            exit(1)
+        ctx.call_on_close(database_util.shutdown)
+        return
 
-    global bot
     if space_after_prefix:
         prefix += ' '
 
     bot.command_prefix = prefix  # Update bot prefix from config
 
+    bot.shard_count = shard_count
+    bot.shard_ids = shard_ids
+
     bot.add_cog(Everyone())
     bot.add_cog(Admin())
 
-    if database_util.startup(name, user, password, host, port):
+    if database_ready:
+        guild_languages.update(database_util.get_languages() or [])
+        async_database_util.startup(config.get_db_pool_max())
+        metrics_util.register_collector(collect_metrics)
+        try:
+            metrics_util.start(config.get_metrics_host(), config.get_metrics_port(), config.get_metrics_slow_log_ms())
+        except OSError as error:
+            e_print('Could not start the metrics endpoint:', error)
         try:
-            start_scheduler()
             bot.run(token)
         except discord.errors.LoginFailure:
             e_print('Please check your login credentials at', config.CONFIG_FILE_PATH)
             exit(1)
+        finally:
+            metrics_util.shutdown()
+            scheduler_util.shutdown()
+            if dispatcher is not None:
+                dispatcher.close()
+            async_database_util.shutdown()
+            database_util.shutdown()
+
+
+@start.command(name='export')
+@click.argument('file', type=click.File('w', encoding='utf-8'))
+@click.option('--format', '-f', 'fmt', type=click.Choice(transfer_util.FORMATS),
+              help='Format of the file, guessed by its extension by default')
+@click.option('--guild', '-g', type=int, help='Only export the birthdays of this guild')
+def export_command(file, fmt, guild):
+    """Exports the birthdays of all guilds or a single guild to a CSV or JSON file ('-' for stdout)."""
+    count = transfer_util.export_birthdays(file, fmt or transfer_util.guess_format(file.name), guild)
+    click.echo('Exported %s birthdays.' % count, err=True)
+
+
+@start.command(name='import')
+@click.argument('file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--format', '-f', 'fmt', type=click.Choice(transfer_util.FORMATS),
+              help='Format of the file, guessed by its extension by default')
+@click.option('--guild', '-g', type=int, help='Import all birthdays into this guild, ignoring the guild_id column')
+def import_command(file, fmt, guild):
+    """Imports the birthdays of a CSV or JSON file with the columns guild_id, person_id and birthday."""
+    def progress(valid, rejected):
+        click.echo('Read %s valid and %s rejected lines.' % (valid, rejected), err=True)
+
+    try:
+        imported, rejected = transfer_util.import_birthdays(file, fmt or transfer_util.guess_format(file.name),
+                                                            guild, progress)
+    except ValueError as error:
+        e_print('Could not read %s:' % file.name, error)
+        exit(1)
+    for line, reason in rejected:
+        e_print('Rejected line %s: %s' % (line, reason))
+    if imported is None:
+        e_print('Could not import the birthdays.')
+        exit(1)
+    click.echo('Imported %s birthdays, rejected %s lines.' % (imported, len(rejected)))
 
 
 if __name__ == '__main__':
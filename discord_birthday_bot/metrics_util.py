@@ -0,0 +1,176 @@
+import asyncio
+import functools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = 'birthday_bot_'
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+SLOW_LOG_SECONDS = None  # timings at least this slow are logged as JSON lines, None disables the log
+
+_lock = threading.Lock()
+_histograms = {}  # name -> {labels -> [bucket counts, sum, count]}
+_counters = {}  # name -> {labels -> value}
+_collectors = []  # functions returning {name: value} of current gauge values
+_server = None
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, seconds, **labels):
+    """Records a duration in the histogram of the given name."""
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        entry = series.get(_key(labels))
+        if entry is None:
+            entry = series[_key(labels)] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry[0][i] += 1
+        entry[1] += seconds
+        entry[2] += 1
+
+
+def inc(name, value=1, **labels):
+    """Increments the counter of the given name."""
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[_key(labels)] = series.get(_key(labels), 0) + value
+
+
+def register_collector(collector):
+    """Registers a function returning a dict of gauge names and their current values, e.g. the pool usage."""
+    _collectors.append(collector)
+
+
+def log(name, seconds, guild_id=None, **labels):
+    """Writes a structured log line if the timing is slower than the configured threshold."""
+    if SLOW_LOG_SECONDS is None or seconds < SLOW_LOG_SECONDS:
+        return
+    entry = dict(labels, metric=name, seconds=round(seconds, 6), time=time.time())
+    if guild_id is not None:
+        entry['guild_id'] = guild_id
+    print(json.dumps(entry), file=sys.stderr)
+
+
+def guild_of(args):
+    """Returns the guild id of the arguments of a database function, i.e. the first argument or its guild."""
+    if not args:
+        return None
+    first = args[0]
+    if isinstance(first, int):
+        return first
+    if hasattr(first, 'guild_id'):
+        return first.guild_id
+    guild = getattr(first, 'guild', None)
+    return getattr(guild, 'id', None)
+
+
+def timed(name):
+    """Decorator which records the duration of every call of a function or coroutine function in the histogram
+    <name>_seconds and its errors in the counter <name>_errors_total, both labeled with the function name."""
+    def decorator(func):
+        def record(start, args, failed):
+            seconds = time.perf_counter() - start
+            observe(name + '_seconds', seconds, function=func.__name__)
+            if failed:
+                inc(name + '_errors_total', function=func.__name__)
+            log(name, seconds, guild_of(args), function=func.__name__)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                failed = True
+                try:
+                    result = await func(*args, **kwargs)
+                    failed = False
+                    return result
+                finally:
+                    record(start, args, failed)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                failed = True
+                try:
+                    result = func(*args, **kwargs)
+                    failed = False
+                    return result
+                finally:
+                    record(start, args, failed)
+        return wrapper
+    return decorator
+
+
+def _labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('%s="%s"' % (label, str(value).replace('"', '\\"')) for label, value in pairs) + '}'
+
+
+def render():
+    """Returns all metrics in the Prometheus text format."""
+    lines = []
+    with _lock:
+        for name, series in sorted(_histograms.items()):
+            lines.append('# TYPE %s%s histogram' % (PREFIX, name))
+            for key, (buckets, total, count) in sorted(series.items()):
+                for bound, bucket in zip(BUCKETS, buckets):
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('%s%s_bucket%s %s' % (PREFIX, name, _labels(key, [('le', le)]), bucket))
+                lines.append('%s%s_sum%s %s' % (PREFIX, name, _labels(key), total))
+                lines.append('%s%s_count%s %s' % (PREFIX, name, _labels(key), count))
+        for name, series in sorted(_counters.items()):
+            lines.append('# TYPE %s%s counter' % (PREFIX, name))
+            for key, value in sorted(series.items()):
+                lines.append('%s%s%s %s' % (PREFIX, name, _labels(key), value))
+
+    for collector in _collectors:
+        for name, value in sorted(collector().items()):
+            lines.append('# TYPE %s%s gauge' % (PREFIX, name))
+            lines.append('%s%s %s' % (PREFIX, name, value))
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the metrics at /metrics."""
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # don't log every scrape
+
+
+def start(host, port, slow_log_ms=None):
+    """Serves the metrics on the given address in a background thread. A port of 0 disables the endpoint.
+    Timings slower than slow_log_ms milliseconds are logged as JSON lines to stderr, None disables the log."""
+    global _server, SLOW_LOG_SECONDS
+    if slow_log_ms is not None:
+        SLOW_LOG_SECONDS = slow_log_ms / 1000
+    if port:
+        _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=_server.serve_forever, name='metrics', daemon=True).start()
+
+
+def shutdown():
+    """Stops the metrics endpoint."""
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server = None
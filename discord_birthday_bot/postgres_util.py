@@ -0,0 +1,563 @@
+import csv
+import io
+import re
+import threading
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+from discord_birthday_bot.storage_util import (
+    Storage, TABLE_NAME_DATA, COLUMN_PERSON_ID, COLUMN_BIRTHDAY, COLUMN_GUILD_ID, COLUMN_MONTH_DAY,
+    INDEX_MONTH_DAY, INDEX_GUILD_MONTH_DAY, TABLE_NAME_SETTINGS, COLUMN_CHANNEL_ID, COLUMN_LIST_MSG_ID,
+    COLUMN_LIST_MSG_IDS, COLUMN_lIST_MSG_CH_ID, COLUMN_TIMEZONE, COLUMN_GREETING_HOUR, COLUMN_LAST_GREETING,
+    COLUMN_DIGEST_WEEKDAY, COLUMN_LAST_DIGEST, COLUMN_LANGUAGE, TABLE_NAME_IMPORT, COLUMN_LINE, TABLE_NAME_LEASE,
+    COLUMN_NAME, COLUMN_OWNER, COLUMN_EXPIRES, TABLE_NAME_GREETING_LOG, COLUMN_DAY, COLUMN_CLAIMED_BY,
+    COLUMN_CLAIMED_AT, COLUMN_SENT_AT
+)
+
+# Month and day as sortable number, e.g. 1231 for December 31st #
+MONTH_DAY_EXPRESSION = f'(DATE_PART(\'month\', {COLUMN_BIRTHDAY}) * 100 ' \
+                       f'+ DATE_PART(\'day\', {COLUMN_BIRTHDAY}))::SMALLINT'
+
+EXPORT_CHUNK_SIZE = 10000
+LIST_CHUNK_SIZE = 1000
+
+# Statements on the temporary import table aren't prepared, as the table is created anew for every import #
+UNPREPARED = ('import_guilds', 'import_merge')
+
+
+def to_prepared(query):
+    """Returns the query with the numbered parameters of PREPARE ($1, $2, ...) instead of the ones of psycopg2
+    and the number of parameters."""
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group() == '%%':
+            return '%'
+        count += 1
+        return '$%s' % count
+    return re.sub('%%|%s', replace, query), count
+
+
+class ConnectionPool(pool.ThreadedConnectionPool):
+    """Thread safe connection pool that waits for a free connection instead of failing when exhausted.
+    Counts how often an idle connection could be reused (hit), a new one had to be opened (miss)
+    and a caller had to wait for a connection to be returned (wait)."""
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.waits += 1
+            self._slots.acquire()
+        try:
+            with self._stats_lock:
+                if self._pool:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        """Returns the usage counters and the current size of the pool."""
+        with self._stats_lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'idle': len(self._pool),
+                'in_use': len(self._used),
+                'min': self.minconn,
+                'max': self.maxconn
+            }
+
+
+class PreparingConnection(extensions.connection):
+    """Connection which remembers the statements prepared in its session."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class PostgresStorage(Storage):
+    """Stores the birthdays in a PostgreSQL database (version 12 or newer), shared by all replicas of the bot.
+
+    Every statement is prepared on the server the first time a pooled connection executes it,
+    so it is parsed and planned only once per connection."""
+
+    Error = psycopg2.Error
+
+    def __init__(self, name, user, password, host, port, pool_min=1, pool_max=10):
+        """Builds the connection pool. Raises psycopg2.Error if the database can't be reached."""
+        super().__init__()
+        self.prepared = {}  # statement name -> (PREPARE, EXECUTE)
+        for statement, query in self.queries.items():
+            query, count = to_prepared(query)
+            params = ' (%s)' % ', '.join(['%s'] * count) if count else ''
+            self.prepared[statement] = (f'PREPARE {statement} AS {query}', f'EXECUTE {statement}{params};')
+        self.pool = ConnectionPool(pool_min, pool_max, user=user, password=password, host=host, port=port,
+                                   database=name, connection_factory=PreparingConnection)
+
+    def run(self, cursor, name, params, many):
+        # Server side cursors can only declare plain queries #
+        if cursor.name is not None or name in UNPREPARED:
+            cursor.execute(self.queries[name], params)
+            return
+        prepare, execute = self.prepared[name]
+        if name not in cursor.connection.prepared:
+            cursor.execute(prepare)
+            cursor.connection.prepared.add(name)
+        cursor.execute(execute, params)
+
+    def connect(self):
+        """Borrows a connection from the pool."""
+        if self.pool is None:
+            return None
+        try:
+            return self.pool.getconn()
+        except (Exception, psycopg2.Error) as error:
+            print('Something went wrong:', error)
+            return None
+
+    def disconnect(self, connection):
+        """Returns the connection to the pool. Broken connections are closed and replaced on demand."""
+        if connection:
+            broken = connection.closed != 0
+            if not broken and connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except psycopg2.Error:
+                    broken = True
+            self.pool.putconn(connection, close=broken)
+
+    def stats(self):
+        if self.pool is None:
+            return None
+        return self.pool.stats()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.closeall()
+            self.pool = None
+
+    def create_tables(self):
+        with self.borrow() as connection:
+            if connection is not None:
+                # Add new column on update from 0.1.x #
+                query = f'ALTER TABLE IF EXISTS {TABLE_NAME_SETTINGS} ' \
+                        f'ADD COLUMN IF NOT EXISTS {COLUMN_LIST_MSG_ID} BIGINT, ' \
+                        f'ADD COLUMN IF NOT EXISTS {COLUMN_lIST_MSG_CH_ID} BIGINT; '
+
+                # Create tables #
+                query += f'CREATE TABLE IF NOT EXISTS {TABLE_NAME_DATA}' \
+                         f'({COLUMN_PERSON_ID} BIGINT NOT NULL, ' \
+                         f'{COLUMN_BIRTHDAY} DATE, ' \
+                         f'{COLUMN_GUILD_ID} BIGINT, ' \
+                         f'{COLUMN_MONTH_DAY} SMALLINT GENERATED ALWAYS AS ({MONTH_DAY_EXPRESSION}) STORED, ' \
+                         f'PRIMARY KEY ({COLUMN_PERSON_ID}, {COLUMN_GUILD_ID}));'
+                query += f'CREATE TABLE IF NOT EXISTS {TABLE_NAME_SETTINGS}' \
+                         f'({COLUMN_GUILD_ID} BIGINT PRIMARY KEY NOT NULL, ' \
+                         f'{COLUMN_CHANNEL_ID} BIGINT, ' \
+                         f'{COLUMN_LIST_MSG_ID} BIGINT, ' \
+                         f'{COLUMN_lIST_MSG_CH_ID} BIGINT, ' \
+                         f'{COLUMN_LIST_MSG_IDS} BIGINT[], ' \
+                         f'{COLUMN_TIMEZONE} TEXT, ' \
+                         f'{COLUMN_GREETING_HOUR} SMALLINT NOT NULL DEFAULT 0, ' \
+                         f'{COLUMN_LAST_GREETING} DATE, ' \
+                         f'{COLUMN_DIGEST_WEEKDAY} SMALLINT, ' \
+                         f'{COLUMN_LAST_DIGEST} DATE, ' \
+                         f'{COLUMN_LANGUAGE} TEXT);'
+
+                # Add greeting time and month-day key on update from 0.2.x #
+                query += f'ALTER TABLE {TABLE_NAME_SETTINGS} ' \
+                         f'ADD COLUMN IF NOT EXISTS {COLUMN_TIMEZONE} TEXT, ' \
+                         f'ADD COLUMN IF NOT EXISTS {COLUMN_GREETING_HOUR} SMALLINT NOT NULL DEFAULT 0, ' \
+                         f'ADD COLUMN IF NOT EXISTS {COLUMN_LAST_GREETING} DATE;'
+                query += f'ALTER TABLE {TABLE_NAME_DATA} ' \
+                         f'ADD COLUMN IF NOT EXISTS {COLUMN_MONTH_DAY} SMALLINT ' \
+                         f'GENERATED ALWAYS AS ({MONTH_DAY_EXPRESSION}) STORED;'
+                # The month-day index of the former sweep over all guilds is replaced by the guild index #
+                query += f'DROP INDEX IF EXISTS {INDEX_MONTH_DAY};'
+                query += f'CREATE INDEX IF NOT EXISTS {INDEX_GUILD_MONTH_DAY} ' \
+                         f'ON {TABLE_NAME_DATA} ({COLUMN_GUILD_ID}, {COLUMN_MONTH_DAY});'
+
+                # Coordinate the greetings of several replicas #
+                query += f'CREATE TABLE IF NOT EXISTS {TABLE_NAME_LEASE}' \
+                         f'({COLUMN_NAME} TEXT PRIMARY KEY NOT NULL, ' \
+                         f'{COLUMN_OWNER} TEXT NOT NULL, ' \
+                         f'{COLUMN_EXPIRES} TIMESTAMPTZ NOT NULL);'
+                query += f'CREATE TABLE IF NOT EXISTS {TABLE_NAME_GREETING_LOG}' \
+                         f'({COLUMN_GUILD_ID} BIGINT NOT NULL, ' \
+                         f'{COLUMN_PERSON_ID} BIGINT NOT NULL, ' \
+                         f'{COLUMN_DAY} DATE NOT NULL, ' \
+                         f'{COLUMN_CLAIMED_BY} TEXT NOT NULL, ' \
+                         f'{COLUMN_CLAIMED_AT} TIMESTAMPTZ NOT NULL, ' \
+                         f'{COLUMN_SENT_AT} TIMESTAMPTZ, ' \
+                         f'PRIMARY KEY ({COLUMN_GUILD_ID}, {COLUMN_DAY}, {COLUMN_PERSON_ID}));'
+
+                # Add the weekly digest on update from 0.2.x #
+                query += f'ALTER TABLE {TABLE_NAME_SETTINGS} ' \
+                         f'ADD COLUMN IF NOT EXISTS {COLUMN_DIGEST_WEEKDAY} SMALLINT, ' \
+                         f'ADD COLUMN IF NOT EXISTS {COLUMN_LAST_DIGEST} DATE;'
+
+                # Add the language of the guild on update from 0.2.x #
+                query += f'ALTER TABLE {TABLE_NAME_SETTINGS} ' \
+                         f'ADD COLUMN IF NOT EXISTS {COLUMN_LANGUAGE} TEXT;'
+
+                # Keep one list message per page on update from 0.2.x #
+                query += f'ALTER TABLE {TABLE_NAME_SETTINGS} ' \
+                         f'ADD COLUMN IF NOT EXISTS {COLUMN_LIST_MSG_IDS} BIGINT[];'
+                query += f'UPDATE {TABLE_NAME_SETTINGS} ' \
+                         f'SET {COLUMN_LIST_MSG_IDS} = ARRAY[{COLUMN_LIST_MSG_ID}], {COLUMN_LIST_MSG_ID} = NULL ' \
+                         f'WHERE {COLUMN_LIST_MSG_ID} IS NOT NULL;'
+
+                connection.cursor().execute(query)
+                connection.commit()
+                return True
+            else:
+                return False
+
+    def build_queries(self):
+        birthday_columns = f'{COLUMN_PERSON_ID}, {COLUMN_BIRTHDAY}, {COLUMN_GUILD_ID}'
+        settings_columns = f'{COLUMN_GUILD_ID}, {COLUMN_CHANNEL_ID}, {COLUMN_TIMEZONE}, ' \
+                           f'{COLUMN_GREETING_HOUR}, {COLUMN_LAST_GREETING}, {COLUMN_DIGEST_WEEKDAY}'
+        greeting_settings = f'SELECT {settings_columns} ' \
+                            f'FROM {TABLE_NAME_SETTINGS} ' \
+                            f'WHERE {COLUMN_CHANNEL_ID} IS NOT NULL'
+        channel_settings = f'SELECT {COLUMN_GUILD_ID}, {COLUMN_CHANNEL_ID}, {COLUMN_lIST_MSG_CH_ID}, ' \
+                           f'{COLUMN_LIST_MSG_IDS} ' \
+                           f'FROM {TABLE_NAME_SETTINGS}'
+        entries = f'SELECT {COLUMN_MONTH_DAY}, {COLUMN_PERSON_ID}, DATE_PART(\'year\', {COLUMN_BIRTHDAY})::INT '
+        guild_birthdays = entries + \
+                          f'FROM {TABLE_NAME_DATA} ' \
+                          f'WHERE {COLUMN_GUILD_ID} = %s ' \
+                          f'ORDER BY {COLUMN_MONTH_DAY}, {COLUMN_PERSON_ID};'
+        export = f'SELECT {COLUMN_GUILD_ID}, {COLUMN_PERSON_ID}, {COLUMN_BIRTHDAY} ' \
+                 f'FROM {TABLE_NAME_DATA} '
+
+        def upsert_settings(*columns):
+            return f'INSERT INTO {TABLE_NAME_SETTINGS} ({COLUMN_GUILD_ID}, {", ".join(columns)}) ' \
+                   f'VALUES (%s{", %s" * len(columns)}) ' \
+                   f'ON CONFLICT ({COLUMN_GUILD_ID}) DO UPDATE ' \
+                   f'SET {", ".join(f"{column} = EXCLUDED.{column}" for column in columns)};'
+
+        return {
+            'write_inserts': f'INSERT INTO {TABLE_NAME_DATA} ({birthday_columns}) '
+                             f'SELECT * FROM UNNEST(%s::BIGINT[], %s::DATE[], %s::BIGINT[]) '
+                             f'ON CONFLICT ({COLUMN_PERSON_ID}, {COLUMN_GUILD_ID}) DO UPDATE '
+                             f'SET {COLUMN_BIRTHDAY} = EXCLUDED.{COLUMN_BIRTHDAY};',
+            'write_deletes': f'DELETE FROM {TABLE_NAME_DATA} AS d '
+                             f'USING UNNEST(%s::BIGINT[], %s::BIGINT[]) AS r ({COLUMN_PERSON_ID}, {COLUMN_GUILD_ID}) '
+                             f'WHERE d.{COLUMN_PERSON_ID} = r.{COLUMN_PERSON_ID} '
+                             f'AND d.{COLUMN_GUILD_ID} = r.{COLUMN_GUILD_ID};',
+            'delete_guilds': f'DELETE FROM {TABLE_NAME_SETTINGS} '
+                             f'WHERE {COLUMN_GUILD_ID} = ANY(%s::BIGINT[]);',
+            'delete_guilds_log': f'DELETE FROM {TABLE_NAME_GREETING_LOG} '
+                                 f'WHERE {COLUMN_GUILD_ID} = ANY(%s::BIGINT[]);',
+            'insert': f'INSERT INTO {TABLE_NAME_DATA} ({birthday_columns}) VALUES (%s, %s, %s) '
+                      f'ON CONFLICT ({COLUMN_PERSON_ID}, {COLUMN_GUILD_ID}) DO UPDATE '
+                      f'SET {COLUMN_BIRTHDAY} = EXCLUDED.{COLUMN_BIRTHDAY} '
+                      f'WHERE {TABLE_NAME_DATA}.{COLUMN_BIRTHDAY} IS DISTINCT FROM EXCLUDED.{COLUMN_BIRTHDAY};',
+            'delete': f'DELETE FROM {TABLE_NAME_DATA} '
+                      f'WHERE {COLUMN_PERSON_ID} = %s '
+                      f'AND {COLUMN_GUILD_ID} = %s;',
+            'delete_all': f'DELETE FROM {TABLE_NAME_DATA} '
+                          f'WHERE {COLUMN_GUILD_ID} = %s;',
+            'prune_members': f'DELETE FROM {TABLE_NAME_DATA} '
+                             f'WHERE {COLUMN_GUILD_ID} = %s '
+                             f'AND {COLUMN_PERSON_ID} > %s '
+                             f'AND {COLUMN_PERSON_ID} <= %s '
+                             f'AND {COLUMN_PERSON_ID} <> ALL(%s::BIGINT[]);',
+            'load_guild_day': f'SELECT {COLUMN_PERSON_ID}, DATE_PART(\'year\', {COLUMN_BIRTHDAY})::INT '
+                              f'FROM {TABLE_NAME_DATA} '
+                              f'WHERE {COLUMN_GUILD_ID} = %s '
+                              f'AND {COLUMN_MONTH_DAY} = %s '
+                              f'AND {COLUMN_PERSON_ID} > %s '
+                              f'ORDER BY {COLUMN_PERSON_ID} '
+                              f'LIMIT %s::BIGINT;',
+            'load_guild': guild_birthdays,
+            'load_range': entries +
+                          f'FROM {TABLE_NAME_DATA} '
+                          f'WHERE {COLUMN_GUILD_ID} = %s '
+                          f'AND {COLUMN_MONTH_DAY} BETWEEN %s AND %s '
+                          f'ORDER BY {COLUMN_MONTH_DAY}, {COLUMN_PERSON_ID} '
+                          f'LIMIT %s::BIGINT;',
+            'iter_guild': guild_birthdays,
+            'iter_birthdays': export + f'ORDER BY {COLUMN_GUILD_ID}, {COLUMN_MONTH_DAY};',
+            'iter_guild_birthdays': export + f'WHERE {COLUMN_GUILD_ID} = %s ORDER BY {COLUMN_MONTH_DAY};',
+            'import_guilds': f'SELECT DISTINCT {COLUMN_GUILD_ID} FROM {TABLE_NAME_IMPORT};',
+            'import_merge': f'INSERT INTO {TABLE_NAME_DATA} ({birthday_columns}) '
+                            f'SELECT DISTINCT ON ({COLUMN_GUILD_ID}, {COLUMN_PERSON_ID}) {birthday_columns} '
+                            f'FROM {TABLE_NAME_IMPORT} '
+                            f'ORDER BY {COLUMN_GUILD_ID}, {COLUMN_PERSON_ID}, {COLUMN_LINE} DESC '
+                            f'ON CONFLICT ({COLUMN_PERSON_ID}, {COLUMN_GUILD_ID}) DO UPDATE '
+                            f'SET {COLUMN_BIRTHDAY} = EXCLUDED.{COLUMN_BIRTHDAY};',
+            'set_list_msg': upsert_settings(COLUMN_lIST_MSG_CH_ID, COLUMN_LIST_MSG_IDS),
+            'remove_list_msg': f'UPDATE {TABLE_NAME_SETTINGS} '
+                               f'SET {COLUMN_LIST_MSG_IDS} = NULL, '
+                               f'{COLUMN_lIST_MSG_CH_ID} = NULL '
+                               f'WHERE {COLUMN_GUILD_ID} = %s;',
+            'set_channel': upsert_settings(COLUMN_CHANNEL_ID),
+            'set_timezone': upsert_settings(COLUMN_TIMEZONE, COLUMN_GREETING_HOUR),
+            'set_language': upsert_settings(COLUMN_LANGUAGE),
+            'get_languages': f'SELECT {COLUMN_GUILD_ID}, {COLUMN_LANGUAGE} '
+                             f'FROM {TABLE_NAME_SETTINGS} '
+                             f'WHERE {COLUMN_LANGUAGE} IS NOT NULL;',
+            'set_digest': upsert_settings(COLUMN_DIGEST_WEEKDAY),
+            'claim_digest': f'UPDATE {TABLE_NAME_SETTINGS} '
+                            f'SET {COLUMN_LAST_DIGEST} = %s::DATE '
+                            f'WHERE {COLUMN_GUILD_ID} = %s '
+                            f'AND ({COLUMN_LAST_DIGEST} IS NULL OR {COLUMN_LAST_DIGEST} < %s::DATE);',
+            'greeting_settings': greeting_settings + ';',
+            'guild_greeting_settings': greeting_settings + f' AND {COLUMN_GUILD_ID} = %s;',
+            # Same shard assignment as discord #
+            'shard_greeting_settings': greeting_settings + f' AND ({COLUMN_GUILD_ID} >> 22) %% %s::BIGINT '
+                                                           f'= ANY(%s::BIGINT[]);',
+            'channel_settings': channel_settings + ';',
+            'guild_channel_settings': channel_settings + f' WHERE {COLUMN_GUILD_ID} = %s;',
+            'shard_channel_settings': channel_settings + f' WHERE ({COLUMN_GUILD_ID} >> 22) %% %s::BIGINT '
+                                                          f'= ANY(%s::BIGINT[]);',
+            'set_last_greeting': f'UPDATE {TABLE_NAME_SETTINGS} '
+                                 f'SET {COLUMN_LAST_GREETING} = %s '
+                                 f'WHERE {COLUMN_GUILD_ID} = %s;',
+            'prune_greeting_log': f'DELETE FROM {TABLE_NAME_GREETING_LOG} '
+                                  f'WHERE {COLUMN_GUILD_ID} = %s '
+                                  f'AND {COLUMN_DAY} < %s;',
+            'acquire_lease': f'INSERT INTO {TABLE_NAME_LEASE} ({COLUMN_NAME}, {COLUMN_OWNER}, {COLUMN_EXPIRES}) '
+                             f'VALUES (%s, %s, NOW() + %s::FLOAT8 * INTERVAL \'1 second\') '
+                             f'ON CONFLICT ({COLUMN_NAME}) DO UPDATE '
+                             f'SET {COLUMN_OWNER} = EXCLUDED.{COLUMN_OWNER}, '
+                             f'{COLUMN_EXPIRES} = EXCLUDED.{COLUMN_EXPIRES} '
+                             f'WHERE {TABLE_NAME_LEASE}.{COLUMN_OWNER} = EXCLUDED.{COLUMN_OWNER} '
+                             f'OR {TABLE_NAME_LEASE}.{COLUMN_EXPIRES} < NOW() '
+                             f'RETURNING {COLUMN_OWNER};',
+            'claim_greetings': f'INSERT INTO {TABLE_NAME_GREETING_LOG} '
+                               f'({COLUMN_GUILD_ID}, {COLUMN_PERSON_ID}, {COLUMN_DAY}, '
+                               f'{COLUMN_CLAIMED_BY}, {COLUMN_CLAIMED_AT}) '
+                               f'SELECT %s::BIGINT, UNNEST(%s::BIGINT[]), %s::DATE, %s::TEXT, NOW() '
+                               f'ON CONFLICT ({COLUMN_GUILD_ID}, {COLUMN_DAY}, {COLUMN_PERSON_ID}) DO UPDATE '
+                               f'SET {COLUMN_CLAIMED_BY} = EXCLUDED.{COLUMN_CLAIMED_BY}, '
+                               f'{COLUMN_CLAIMED_AT} = EXCLUDED.{COLUMN_CLAIMED_AT} '
+                               f'WHERE {TABLE_NAME_GREETING_LOG}.{COLUMN_SENT_AT} IS NULL '
+                               f'AND {TABLE_NAME_GREETING_LOG}.{COLUMN_CLAIMED_AT} '
+                               f'< NOW() - %s::FLOAT8 * INTERVAL \'1 second\' '
+                               f'RETURNING {COLUMN_PERSON_ID};',
+            'sent_greetings': f'SELECT {COLUMN_PERSON_ID} '
+                              f'FROM {TABLE_NAME_GREETING_LOG} '
+                              f'WHERE {COLUMN_GUILD_ID} = %s '
+                              f'AND {COLUMN_DAY} = %s '
+                              f'AND {COLUMN_PERSON_ID} = ANY(%s::BIGINT[]) '
+                              f'AND {COLUMN_SENT_AT} IS NOT NULL;',
+            'set_greetings_sent': f'UPDATE {TABLE_NAME_GREETING_LOG} '
+                                  f'SET {COLUMN_SENT_AT} = NOW() '
+                                  f'WHERE {COLUMN_GUILD_ID} = %s '
+                                  f'AND {COLUMN_DAY} = %s '
+                                  f'AND {COLUMN_PERSON_ID} = ANY(%s::BIGINT[]);'
+        }
+
+    def write_changes(self, inserts, deletes, guild_ids):
+        with self.borrow(flush=False) as connection:
+            if connection is not None:
+                cursor = connection.cursor()
+                if inserts:
+                    self.execute(cursor, 'write_inserts', [list(column) for column in zip(*inserts)])
+                if deletes:
+                    self.execute(cursor, 'write_deletes', [list(column) for column in zip(*deletes)])
+                if guild_ids:
+                    self.execute(cursor, 'delete_guilds', (list(guild_ids),))
+                    self.execute(cursor, 'delete_guilds_log', (list(guild_ids),))
+                connection.commit()
+                return True
+            else:
+                return False
+
+    def insert(self, person_id, birthday, guild_id):
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = self.execute(connection.cursor(), 'insert', (person_id, birthday, guild_id))
+                connection.commit()
+                return cursor.rowcount
+            else:
+                return None
+
+    def delete(self, person_id, guild_id):
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = self.execute(connection.cursor(), 'delete', (person_id, guild_id))
+                connection.commit()
+                return cursor.rowcount
+            else:
+                return None
+
+    def delete_all(self, guild_id):
+        return self.write('delete_all', (guild_id,))
+
+    def prune_members(self, guild_id, ranges):
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = connection.cursor()
+                deleted = 0
+                for lower, upper, member_ids in ranges:
+                    deleted += self.execute(cursor, 'prune_members', (guild_id, lower, upper, member_ids)).rowcount
+                connection.commit()
+                return deleted
+            else:
+                return None
+
+    def load_guild_day(self, guild_id, month_day, after=0, limit=None):
+        return self.fetch('load_guild_day', (guild_id, month_day, after, limit))
+
+    def load_guild(self, guild_id):
+        return self.fetch('load_guild', (guild_id,))
+
+    def load_range(self, guild_id, first, last, limit=None):
+        return self.fetch('load_range', (guild_id, first, last, limit))
+
+    def iter_guild(self, guild_id):
+        """Streams the birthdays by a server side cursor."""
+        with self.borrow() as connection:
+            if connection is None:
+                return
+            cursor = connection.cursor(name='list_birthdays')
+            cursor.itersize = LIST_CHUNK_SIZE
+            yield from self.execute(cursor, 'iter_guild', (guild_id,))
+            cursor.close()
+
+    def iter_birthdays(self, guild_id=None):
+        """Streams the birthdays by a server side cursor, so even large tables don't need to fit into memory."""
+        with self.borrow() as connection:
+            if connection is None:
+                return
+            cursor = connection.cursor(name='export_birthdays')
+            cursor.itersize = EXPORT_CHUNK_SIZE
+            if guild_id is None:
+                self.execute(cursor, 'iter_birthdays')
+            else:
+                self.execute(cursor, 'iter_guild_birthdays', (guild_id,))
+            yield from cursor
+            cursor.close()
+
+    def import_birthdays(self, chunks):
+        """All chunks are loaded via COPY into a staging table and merged into the birthday table
+        with a single statement."""
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = connection.cursor()
+                cursor.execute(f'CREATE TEMPORARY TABLE {TABLE_NAME_IMPORT} '
+                               f'({COLUMN_LINE} BIGINT, '
+                               f'{COLUMN_PERSON_ID} BIGINT, '
+                               f'{COLUMN_BIRTHDAY} DATE, '
+                               f'{COLUMN_GUILD_ID} BIGINT) '
+                               f'ON COMMIT DROP;')
+                for chunk in chunks:
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerows(chunk)
+                    buffer.seek(0)
+                    cursor.copy_expert(f'COPY {TABLE_NAME_IMPORT} FROM STDIN WITH (FORMAT csv);', buffer)
+
+                guild_ids = [row[0] for row in self.execute(cursor, 'import_guilds').fetchall()]
+                merged = self.execute(cursor, 'import_merge').rowcount
+                connection.commit()
+                return merged, guild_ids
+            else:
+                return None
+
+    def set_list_msg(self, guild_id, channel_id, msg_ids):
+        return self.write('set_list_msg', (guild_id, channel_id, list(msg_ids)))
+
+    def remove_list_msg(self, guild_id):
+        return self.write('remove_list_msg', (guild_id,))
+
+    def set_channel(self, guild_id, channel_id):
+        return self.write('set_channel', (guild_id, channel_id))
+
+    def set_timezone(self, guild_id, timezone, hour):
+        return self.write('set_timezone', (guild_id, timezone, hour))
+
+    def set_language(self, guild_id, language):
+        return self.write('set_language', (guild_id, language))
+
+    def get_languages(self):
+        return self.fetch('get_languages')
+
+    def set_digest(self, guild_id, weekday):
+        return self.write('set_digest', (guild_id, weekday))
+
+    def claim_digest(self, guild_id, day):
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = self.execute(connection.cursor(), 'claim_digest', (day, guild_id, day))
+                connection.commit()
+                return cursor.rowcount > 0
+            else:
+                return None
+
+    def get_greeting_settings(self, guild_id=None, shard_count=None, shard_ids=None):
+        if guild_id is not None:
+            return self.fetch('guild_greeting_settings', (guild_id,))
+        elif shard_ids is not None:
+            return self.fetch('shard_greeting_settings', (shard_count, list(shard_ids)))
+        else:
+            return self.fetch('greeting_settings')
+
+    def get_channel_settings(self, guild_id=None, shard_count=None, shard_ids=None):
+        if guild_id is not None:
+            return self.fetch('guild_channel_settings', (guild_id,))
+        elif shard_ids is not None:
+            return self.fetch('shard_channel_settings', (shard_count, list(shard_ids)))
+        else:
+            return self.fetch('channel_settings')
+
+    def set_last_greeting(self, guild_id, day, log_until):
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = connection.cursor()
+                self.execute(cursor, 'set_last_greeting', (day, guild_id))
+                self.execute(cursor, 'prune_greeting_log', (guild_id, log_until))
+                connection.commit()
+                return True
+            else:
+                return False
+
+    def acquire_lease(self, name, owner, seconds):
+        with self.borrow() as connection:
+            if connection is not None:
+                acquired = self.execute(connection.cursor(), 'acquire_lease', (name, owner, seconds)).fetchone()
+                connection.commit()
+                return acquired is not None
+            else:
+                return None
+
+    def claim_greetings(self, guild_id, day, person_ids, owner, timeout):
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = self.execute(connection.cursor(), 'claim_greetings',
+                                      (guild_id, list(person_ids), day, owner, timeout))
+                claimed = [row[0] for row in cursor.fetchall()]
+                cursor = self.execute(cursor, 'sent_greetings', (guild_id, day, list(person_ids)))
+                sent = [row[0] for row in cursor.fetchall()]
+                connection.commit()
+                return claimed, sent
+            else:
+                return None
+
+    def set_greetings_sent(self, guild_id, day, person_ids):
+        return self.write('set_greetings_sent', (guild_id, day, list(person_ids)))
@@ -0,0 +1,101 @@
+import atexit
+import builtins
+import importlib
+import sys
+import time
+from contextlib import contextmanager
+
+STARTED = time.perf_counter()  # imported first by main, so this is about the start of the process
+
+ENABLED = False
+PRINTED = False
+PHASES = []
+IMPORTS = {}  # module -> seconds of its first import including its dependencies, recorded while main is imported
+TOP_IMPORTS = 15  # slowest imports shown in the report
+
+_import = builtins.__import__
+_import_depth = 0
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """Replacement of __import__ which records the time of every outermost import of a new module."""
+    global _import_depth
+    if level:
+        key = None
+    elif name not in sys.modules:
+        key = name
+    else:
+        # from package import module only imports the submodules which are missing #
+        module = sys.modules[name]
+        missing = [item for item in fromlist or () if item != '*' and not hasattr(module, item)]
+        key = '%s.%s' % (name, ', '.join(missing)) if missing else None
+    if key is None:
+        return _import(name, globals, locals, fromlist, level)
+
+    _import_depth += 1
+    start = time.perf_counter()
+    try:
+        return _import(name, globals, locals, fromlist, level)
+    finally:
+        _import_depth -= 1
+        if not _import_depth:
+            IMPORTS[key] = IMPORTS.get(key, 0) + time.perf_counter() - start
+
+
+# The imports are only timed if profiling is requested, anything else importing main keeps the plain import #
+if '--profile-startup' in sys.argv[1:]:
+    builtins.__import__ = _timed_import
+
+
+def enable():
+    """Records all startup phases and prints them with print_report, at the latest when the process exits,
+    so a startup failing or hanging before the bot is ready is reported as well."""
+    global ENABLED
+    ENABLED = True
+    atexit.register(print_report)
+
+
+def stop_import_timing():
+    """Stops recording the imports, called once main is imported."""
+    if builtins.__import__ is _timed_import:
+        builtins.__import__ = _import
+
+
+def record(name, seconds):
+    """Records the duration of a startup phase."""
+    PHASES.append((name, seconds))
+
+
+def record_since_start(name):
+    """Records the time from the start of the process until now."""
+    record(name, time.perf_counter() - STARTED)
+
+
+@contextmanager
+def phase(name):
+    """Records the duration of the with block as startup phase."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def import_module(name):
+    """Imports a module and records how long it took, if it was not imported before."""
+    with phase('import ' + name):
+        return importlib.import_module(name)
+
+
+def print_report():
+    """Prints all recorded startup phases and the slowest imports of main once, if profiling is enabled."""
+    global PRINTED
+    if not ENABLED or PRINTED:
+        return
+    PRINTED = True
+    print('Startup profile:')
+    for name, seconds in PHASES:
+        print('  %-40s %8.1f ms' % (name, seconds * 1000))
+    print('Slowest imports of main:')
+    for name, seconds in sorted(IMPORTS.items(), key=lambda item: item[1], reverse=True)[:TOP_IMPORTS]:
+        print('  %-40s %8.1f ms' % (name, seconds * 1000))
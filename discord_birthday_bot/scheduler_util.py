@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+
+import pytz
+
+from discord_birthday_bot import metrics_util, profile_util
+
+MAX_SPREAD = 3600  # greetings are spread within the greeting hour
+
+SCHEDULER = None
+CALLBACK = None
+DIGEST_CALLBACK = None
+SPREAD = 0
+
+
+def start(callback, spread, digest_callback=None):
+    """Starts the scheduler. The callback is called with guild id, channel id and timezone whenever a guild is due,
+    the digest callback with the same arguments on the weekday of the weekly digest of the guild.
+    Greetings of guilds sharing the same greeting hour are spread over the given number of seconds."""
+    global SCHEDULER, CALLBACK, DIGEST_CALLBACK, SPREAD
+    CALLBACK = callback
+    DIGEST_CALLBACK = digest_callback
+    SPREAD = max(1, min(int(spread), MAX_SPREAD))
+    background = profile_util.import_module('apscheduler.schedulers.background')
+    events = profile_util.import_module('apscheduler.events')
+    SCHEDULER = background.BackgroundScheduler(daemon=True)
+    SCHEDULER.add_listener(observe_lag, events.EVENT_JOB_SUBMITTED)
+    SCHEDULER.start()
+
+
+def shutdown():
+    """Stops the scheduler without waiting for running greetings."""
+    global SCHEDULER
+    if SCHEDULER is not None:
+        SCHEDULER.shutdown(wait=False)
+        SCHEDULER = None
+
+
+def observe_lag(event):
+    """Records how late a greeting job was submitted compared to its scheduled time."""
+    lag = datetime.now(timezone.utc) - max(event.scheduled_run_times)
+    metrics_util.observe('scheduler_lag_seconds', max(0.0, lag.total_seconds()))
+
+
+def is_running():
+    """Returns True if the scheduler was started, False otherwise."""
+    return SCHEDULER is not None
+
+
+def get_timezone(name):
+    """Returns the timezone of the given name or the local timezone if no name is given.
+    Raises pytz.UnknownTimeZoneError if the timezone does not exist."""
+    if not name:
+        return SCHEDULER.timezone
+    return pytz.timezone(name)
+
+
+def get_offset(guild_id):
+    """Returns the fixed delay in seconds of the guild within the greeting hour.
+    The creation time of the guild is used, as it is evenly distributed."""
+    return (guild_id >> 22) % SPREAD
+
+
+def schedule_guild(guild_id, channel_id, timezone, hour, last_greeting=None, digest_weekday=None, catch_up=False):
+    """(Re)schedules the daily greeting and the weekly digest of the guild at its local greeting hour.
+    With catch_up the greeting is sent right away if today's greeting was missed while the bot was offline."""
+    tz = get_timezone(timezone)
+    offset = get_offset(guild_id)
+    SCHEDULER.add_job(CALLBACK, 'cron', args=(guild_id, channel_id, tz),
+                      hour=hour, minute=offset // 60, second=offset % 60, timezone=tz,
+                      id=str(guild_id), replace_existing=True, coalesce=True, misfire_grace_time=MAX_SPREAD)
+
+    if digest_weekday is None or DIGEST_CALLBACK is None:
+        if SCHEDULER.get_job(f'{guild_id}-digest') is not None:
+            SCHEDULER.remove_job(f'{guild_id}-digest')
+    else:
+        SCHEDULER.add_job(DIGEST_CALLBACK, 'cron', args=(guild_id, channel_id, tz), day_of_week=digest_weekday,
+                          hour=hour, minute=offset // 60, second=offset % 60, timezone=tz,
+                          id=f'{guild_id}-digest', replace_existing=True, coalesce=True,
+                          misfire_grace_time=MAX_SPREAD)
+
+    if catch_up:
+        now = datetime.now(tz)
+        fire_time = tz.localize(datetime.combine(now.date(), datetime.min.time())
+                                + timedelta(hours=hour, seconds=offset))
+        # Guilds never greeted before are caught up as well #
+        if (last_greeting is None or last_greeting < now.date()) and fire_time <= now:
+            SCHEDULER.add_job(CALLBACK, args=(guild_id, channel_id, tz), id=f'{guild_id}-catch-up',
+                              replace_existing=True)
+
+
+def retry_guild(guild_id, channel_id, tz, delay, day):
+    """Runs the greeting of the guild for the given day once more after the given number of seconds.
+    The callback gets the day as fourth argument, so the retry does nothing once the day has passed."""
+    SCHEDULER.add_job(CALLBACK, 'date', run_date=datetime.now(tz) + timedelta(seconds=delay),
+                      args=(guild_id, channel_id, tz, day), id=f'{guild_id}-retry', replace_existing=True)
+
+
+def unschedule_guild(guild_id):
+    """Removes the daily greeting of the guild and its pending retries."""
+    for job_id in (str(guild_id), f'{guild_id}-catch-up', f'{guild_id}-retry', f'{guild_id}-digest'):
+        if SCHEDULER.get_job(job_id) is not None:
+            SCHEDULER.remove_job(job_id)
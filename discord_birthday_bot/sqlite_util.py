@@ -0,0 +1,463 @@
+import json
+import sqlite3
+import threading
+from datetime import date, datetime
+
+from discord_birthday_bot.storage_util import (
+    Storage, TABLE_NAME_DATA, COLUMN_PERSON_ID, COLUMN_BIRTHDAY, COLUMN_GUILD_ID, COLUMN_MONTH_DAY,
+    INDEX_MONTH_DAY, INDEX_GUILD_MONTH_DAY, TABLE_NAME_SETTINGS, COLUMN_CHANNEL_ID, COLUMN_LIST_MSG_IDS,
+    COLUMN_lIST_MSG_CH_ID, COLUMN_TIMEZONE, COLUMN_GREETING_HOUR, COLUMN_LAST_GREETING, COLUMN_DIGEST_WEEKDAY,
+    COLUMN_LAST_DIGEST, COLUMN_LANGUAGE, TABLE_NAME_IMPORT, COLUMN_LINE, TABLE_NAME_LEASE, COLUMN_NAME,
+    COLUMN_OWNER, COLUMN_EXPIRES, TABLE_NAME_GREETING_LOG, COLUMN_DAY, COLUMN_CLAIMED_BY, COLUMN_CLAIMED_AT,
+    COLUMN_SENT_AT
+)
+
+# Month and day as sortable number, e.g. 1231 for December 31st #
+MONTH_DAY_EXPRESSION = f'CAST(strftime(\'%m\', {COLUMN_BIRTHDAY}) AS INTEGER) * 100 ' \
+                       f'+ CAST(strftime(\'%d\', {COLUMN_BIRTHDAY}) AS INTEGER)'
+YEAR_EXPRESSION = f'CAST(strftime(\'%Y\', {COLUMN_BIRTHDAY}) AS INTEGER)'
+
+BUSY_TIMEOUT = 5  # seconds a writer waits for another one
+CACHED_STATEMENTS = 256  # prepared statements kept per connection, more than the bot uses
+
+# Dates are stored as ISO strings like PostgreSQL prints them, birthdays are parsed as datetime but saved as DATE #
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.date().isoformat())
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+
+
+def to_json(ids):
+    """Encodes a list of ids as JSON array, which replaces the array parameters of PostgreSQL via json_each."""
+    return json.dumps(list(ids))
+
+
+class SqliteStorage(Storage):
+    """Stores the birthdays in an embedded SQLite database file, for small deployments without a database server.
+    Only a single bot process may use the file.
+
+    Every thread keeps an own connection, so there is no pool and borrowing costs nothing.
+    The file is opened in WAL mode, so reads don't wait for writes. As the text of every statement is built once,
+    the statement cache of sqlite3 prepares it only once per connection."""
+
+    Error = sqlite3.Error
+
+    def __init__(self, path):
+        """Opens the database file, the file is created if not existing. Raises sqlite3.Error if it can't be opened."""
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._open()
+
+    def run(self, cursor, name, params, many):
+        if many:
+            cursor.executemany(self.queries[name], params)
+        else:
+            cursor.execute(self.queries[name], params)
+
+    def connect(self):
+        """Returns the connection of the current thread, it is opened on first use."""
+        try:
+            return self._open()
+        except sqlite3.Error as error:
+            print('Something went wrong:', error)
+            return None
+
+    def _open(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, detect_types=sqlite3.PARSE_DECLTYPES,
+                                         isolation_level='IMMEDIATE', check_same_thread=False,
+                                         cached_statements=CACHED_STATEMENTS)
+            connection.execute('PRAGMA journal_mode = WAL;')
+            connection.execute('PRAGMA synchronous = NORMAL;')  # durable enough in WAL mode and much faster
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def disconnect(self, connection):
+        """Keeps the connection open for the next borrow of the thread."""
+        if connection is not None and connection.in_transaction:
+            connection.rollback()
+
+    def stats(self):
+        with self._lock:
+            return {'connections': len(self._connections)}
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+    def create_tables(self):
+        with self.borrow() as connection:
+            if connection is not None:
+                query = f'CREATE TABLE IF NOT EXISTS {TABLE_NAME_DATA}' \
+                        f'({COLUMN_PERSON_ID} INTEGER NOT NULL, ' \
+                        f'{COLUMN_BIRTHDAY} DATE, ' \
+                        f'{COLUMN_GUILD_ID} INTEGER, ' \
+                        f'{COLUMN_MONTH_DAY} INTEGER GENERATED ALWAYS AS ({MONTH_DAY_EXPRESSION}) STORED, ' \
+                        f'PRIMARY KEY ({COLUMN_PERSON_ID}, {COLUMN_GUILD_ID}));'
+                query += f'CREATE TABLE IF NOT EXISTS {TABLE_NAME_SETTINGS}' \
+                         f'({COLUMN_GUILD_ID} INTEGER PRIMARY KEY NOT NULL, ' \
+                         f'{COLUMN_CHANNEL_ID} INTEGER, ' \
+                         f'{COLUMN_lIST_MSG_CH_ID} INTEGER, ' \
+                         f'{COLUMN_LIST_MSG_IDS} TEXT, ' \
+                         f'{COLUMN_TIMEZONE} TEXT, ' \
+                         f'{COLUMN_GREETING_HOUR} INTEGER NOT NULL DEFAULT 0, ' \
+                         f'{COLUMN_LAST_GREETING} DATE, ' \
+                         f'{COLUMN_DIGEST_WEEKDAY} INTEGER, ' \
+                         f'{COLUMN_LAST_DIGEST} DATE, ' \
+                         f'{COLUMN_LANGUAGE} TEXT);'
+                # The month-day index of the former sweep over all guilds is replaced by the guild index #
+                query += f'DROP INDEX IF EXISTS {INDEX_MONTH_DAY};'
+                query += f'CREATE INDEX IF NOT EXISTS {INDEX_GUILD_MONTH_DAY} ' \
+                         f'ON {TABLE_NAME_DATA} ({COLUMN_GUILD_ID}, {COLUMN_MONTH_DAY});'
+
+                # Timestamps are saved as UTC strings of datetime('now') #
+                query += f'CREATE TABLE IF NOT EXISTS {TABLE_NAME_LEASE}' \
+                         f'({COLUMN_NAME} TEXT PRIMARY KEY NOT NULL, ' \
+                         f'{COLUMN_OWNER} TEXT NOT NULL, ' \
+                         f'{COLUMN_EXPIRES} TEXT NOT NULL);'
+                query += f'CREATE TABLE IF NOT EXISTS {TABLE_NAME_GREETING_LOG}' \
+                         f'({COLUMN_GUILD_ID} INTEGER NOT NULL, ' \
+                         f'{COLUMN_PERSON_ID} INTEGER NOT NULL, ' \
+                         f'{COLUMN_DAY} DATE NOT NULL, ' \
+                         f'{COLUMN_CLAIMED_BY} TEXT NOT NULL, ' \
+                         f'{COLUMN_CLAIMED_AT} TEXT NOT NULL, ' \
+                         f'{COLUMN_SENT_AT} TEXT, ' \
+                         f'PRIMARY KEY ({COLUMN_GUILD_ID}, {COLUMN_DAY}, {COLUMN_PERSON_ID}));'
+                connection.executescript(query)
+                return True
+            else:
+                return False
+
+    def build_queries(self):
+        birthday_columns = f'{COLUMN_PERSON_ID}, {COLUMN_BIRTHDAY}, {COLUMN_GUILD_ID}'
+        settings_columns = f'{COLUMN_GUILD_ID}, {COLUMN_CHANNEL_ID}, {COLUMN_TIMEZONE}, ' \
+                           f'{COLUMN_GREETING_HOUR}, {COLUMN_LAST_GREETING}, {COLUMN_DIGEST_WEEKDAY}'
+        greeting_settings = f'SELECT {settings_columns} ' \
+                            f'FROM {TABLE_NAME_SETTINGS} ' \
+                            f'WHERE {COLUMN_CHANNEL_ID} IS NOT NULL'
+        channel_settings = f'SELECT {COLUMN_GUILD_ID}, {COLUMN_CHANNEL_ID}, {COLUMN_lIST_MSG_CH_ID}, ' \
+                           f'{COLUMN_LIST_MSG_IDS} ' \
+                           f'FROM {TABLE_NAME_SETTINGS}'
+        entries = f'SELECT {COLUMN_MONTH_DAY}, {COLUMN_PERSON_ID}, {YEAR_EXPRESSION} '
+        guild_birthdays = entries + \
+                          f'FROM {TABLE_NAME_DATA} ' \
+                          f'WHERE {COLUMN_GUILD_ID} = ? ' \
+                          f'ORDER BY {COLUMN_MONTH_DAY}, {COLUMN_PERSON_ID};'
+        export = f'SELECT {COLUMN_GUILD_ID}, {COLUMN_PERSON_ID}, {COLUMN_BIRTHDAY} ' \
+                 f'FROM {TABLE_NAME_DATA} '
+        upsert_birthday = f'INSERT INTO {TABLE_NAME_DATA} ({birthday_columns}) VALUES (?, ?, ?) ' \
+                          f'ON CONFLICT ({COLUMN_PERSON_ID}, {COLUMN_GUILD_ID}) DO UPDATE ' \
+                          f'SET {COLUMN_BIRTHDAY} = excluded.{COLUMN_BIRTHDAY}'
+
+        def upsert_settings(*columns):
+            return f'INSERT INTO {TABLE_NAME_SETTINGS} ({COLUMN_GUILD_ID}, {", ".join(columns)}) ' \
+                   f'VALUES (?{", ?" * len(columns)}) ' \
+                   f'ON CONFLICT ({COLUMN_GUILD_ID}) DO UPDATE ' \
+                   f'SET {", ".join(f"{column} = excluded.{column}" for column in columns)};'
+
+        return {
+            'write_inserts': upsert_birthday + ';',
+            'write_deletes': f'DELETE FROM {TABLE_NAME_DATA} '
+                             f'WHERE {COLUMN_PERSON_ID} = ? '
+                             f'AND {COLUMN_GUILD_ID} = ?;',
+            'delete_guilds': f'DELETE FROM {TABLE_NAME_SETTINGS} '
+                             f'WHERE {COLUMN_GUILD_ID} IN (SELECT value FROM json_each(?));',
+            'delete_guilds_log': f'DELETE FROM {TABLE_NAME_GREETING_LOG} '
+                                 f'WHERE {COLUMN_GUILD_ID} IN (SELECT value FROM json_each(?));',
+            'insert': upsert_birthday + f' WHERE {TABLE_NAME_DATA}.{COLUMN_BIRTHDAY} IS NOT excluded.{COLUMN_BIRTHDAY};',
+            'delete': f'DELETE FROM {TABLE_NAME_DATA} '
+                      f'WHERE {COLUMN_PERSON_ID} = ? '
+                      f'AND {COLUMN_GUILD_ID} = ?;',
+            'delete_all': f'DELETE FROM {TABLE_NAME_DATA} '
+                          f'WHERE {COLUMN_GUILD_ID} = ?;',
+            'prune_members': f'DELETE FROM {TABLE_NAME_DATA} '
+                             f'WHERE {COLUMN_GUILD_ID} = ? '
+                             f'AND {COLUMN_PERSON_ID} > ? '
+                             f'AND {COLUMN_PERSON_ID} <= ? '
+                             f'AND {COLUMN_PERSON_ID} NOT IN (SELECT value FROM json_each(?));',
+            'load_guild_day': f'SELECT {COLUMN_PERSON_ID}, {YEAR_EXPRESSION} '
+                              f'FROM {TABLE_NAME_DATA} '
+                              f'WHERE {COLUMN_GUILD_ID} = ? '
+                              f'AND {COLUMN_MONTH_DAY} = ? '
+                              f'AND {COLUMN_PERSON_ID} > ? '
+                              f'ORDER BY {COLUMN_PERSON_ID} '
+                              f'LIMIT ?;',
+            'load_guild': guild_birthdays,
+            'load_range': entries +
+                          f'FROM {TABLE_NAME_DATA} '
+                          f'WHERE {COLUMN_GUILD_ID} = ? '
+                          f'AND {COLUMN_MONTH_DAY} BETWEEN ? AND ? '
+                          f'ORDER BY {COLUMN_MONTH_DAY}, {COLUMN_PERSON_ID} '
+                          f'LIMIT ?;',
+            'iter_guild': guild_birthdays,
+            'iter_birthdays': export + f'ORDER BY {COLUMN_GUILD_ID}, {COLUMN_MONTH_DAY};',
+            'iter_guild_birthdays': export + f'WHERE {COLUMN_GUILD_ID} = ? ORDER BY {COLUMN_MONTH_DAY};',
+            'import_create': f'CREATE TEMPORARY TABLE IF NOT EXISTS {TABLE_NAME_IMPORT} '
+                             f'({COLUMN_LINE} INTEGER, '
+                             f'{COLUMN_PERSON_ID} INTEGER, '
+                             f'{COLUMN_BIRTHDAY} DATE, '
+                             f'{COLUMN_GUILD_ID} INTEGER);',
+            'import_rows': f'INSERT INTO {TABLE_NAME_IMPORT} VALUES (?, ?, ?, ?);',
+            'import_guilds': f'SELECT DISTINCT {COLUMN_GUILD_ID} FROM {TABLE_NAME_IMPORT};',
+            'import_merge': f'INSERT INTO {TABLE_NAME_DATA} ({birthday_columns}) '
+                            f'SELECT {birthday_columns} '
+                            f'FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY {COLUMN_GUILD_ID}, {COLUMN_PERSON_ID} '
+                            f'ORDER BY {COLUMN_LINE} DESC) AS line_rank FROM {TABLE_NAME_IMPORT}) '
+                            f'WHERE line_rank = 1 '
+                            f'ON CONFLICT ({COLUMN_PERSON_ID}, {COLUMN_GUILD_ID}) DO UPDATE '
+                            f'SET {COLUMN_BIRTHDAY} = excluded.{COLUMN_BIRTHDAY};',
+            'import_drop': f'DROP TABLE temp.{TABLE_NAME_IMPORT};',
+            'set_list_msg': upsert_settings(COLUMN_lIST_MSG_CH_ID, COLUMN_LIST_MSG_IDS),
+            'remove_list_msg': f'UPDATE {TABLE_NAME_SETTINGS} '
+                               f'SET {COLUMN_LIST_MSG_IDS} = NULL, '
+                               f'{COLUMN_lIST_MSG_CH_ID} = NULL '
+                               f'WHERE {COLUMN_GUILD_ID} = ?;',
+            'set_channel': upsert_settings(COLUMN_CHANNEL_ID),
+            'set_timezone': upsert_settings(COLUMN_TIMEZONE, COLUMN_GREETING_HOUR),
+            'set_language': upsert_settings(COLUMN_LANGUAGE),
+            'get_languages': f'SELECT {COLUMN_GUILD_ID}, {COLUMN_LANGUAGE} '
+                             f'FROM {TABLE_NAME_SETTINGS} '
+                             f'WHERE {COLUMN_LANGUAGE} IS NOT NULL;',
+            'set_digest': upsert_settings(COLUMN_DIGEST_WEEKDAY),
+            'claim_digest': f'UPDATE {TABLE_NAME_SETTINGS} '
+                            f'SET {COLUMN_LAST_DIGEST} = ?1 '
+                            f'WHERE {COLUMN_GUILD_ID} = ?2 '
+                            f'AND ({COLUMN_LAST_DIGEST} IS NULL OR {COLUMN_LAST_DIGEST} < ?1);',
+            'greeting_settings': greeting_settings + ';',
+            'guild_greeting_settings': greeting_settings + f' AND {COLUMN_GUILD_ID} = ?;',
+            # Same shard assignment as discord #
+            'shard_greeting_settings': greeting_settings + f' AND ({COLUMN_GUILD_ID} >> 22) % ? '
+                                                           f'IN (SELECT value FROM json_each(?));',
+            'channel_settings': channel_settings + ';',
+            'guild_channel_settings': channel_settings + f' WHERE {COLUMN_GUILD_ID} = ?;',
+            'shard_channel_settings': channel_settings + f' WHERE ({COLUMN_GUILD_ID} >> 22) % ? '
+                                                          f'IN (SELECT value FROM json_each(?));',
+            'set_last_greeting': f'UPDATE {TABLE_NAME_SETTINGS} '
+                                 f'SET {COLUMN_LAST_GREETING} = ? '
+                                 f'WHERE {COLUMN_GUILD_ID} = ?;',
+            'prune_greeting_log': f'DELETE FROM {TABLE_NAME_GREETING_LOG} '
+                                  f'WHERE {COLUMN_GUILD_ID} = ? '
+                                  f'AND {COLUMN_DAY} < ?;',
+            'acquire_lease': f'INSERT INTO {TABLE_NAME_LEASE} ({COLUMN_NAME}, {COLUMN_OWNER}, {COLUMN_EXPIRES}) '
+                             f'VALUES (?, ?, datetime(\'now\', ? || \' seconds\')) '
+                             f'ON CONFLICT ({COLUMN_NAME}) DO UPDATE '
+                             f'SET {COLUMN_OWNER} = excluded.{COLUMN_OWNER}, '
+                             f'{COLUMN_EXPIRES} = excluded.{COLUMN_EXPIRES} '
+                             f'WHERE {TABLE_NAME_LEASE}.{COLUMN_OWNER} = excluded.{COLUMN_OWNER} '
+                             f'OR {TABLE_NAME_LEASE}.{COLUMN_EXPIRES} < datetime(\'now\') '
+                             f'RETURNING {COLUMN_OWNER};',
+            'claim_greetings': f'INSERT INTO {TABLE_NAME_GREETING_LOG} '
+                               f'({COLUMN_GUILD_ID}, {COLUMN_PERSON_ID}, {COLUMN_DAY}, '
+                               f'{COLUMN_CLAIMED_BY}, {COLUMN_CLAIMED_AT}) '
+                               f'SELECT ?, value, ?, ?, datetime(\'now\') FROM json_each(?) WHERE true '
+                               f'ON CONFLICT ({COLUMN_GUILD_ID}, {COLUMN_DAY}, {COLUMN_PERSON_ID}) DO UPDATE '
+                               f'SET {COLUMN_CLAIMED_BY} = excluded.{COLUMN_CLAIMED_BY}, '
+                               f'{COLUMN_CLAIMED_AT} = excluded.{COLUMN_CLAIMED_AT} '
+                               f'WHERE {TABLE_NAME_GREETING_LOG}.{COLUMN_SENT_AT} IS NULL '
+                               f'AND {TABLE_NAME_GREETING_LOG}.{COLUMN_CLAIMED_AT} '
+                               f'< datetime(\'now\', -? || \' seconds\') '
+                               f'RETURNING {COLUMN_PERSON_ID};',
+            'sent_greetings': f'SELECT {COLUMN_PERSON_ID} '
+                              f'FROM {TABLE_NAME_GREETING_LOG} '
+                              f'WHERE {COLUMN_GUILD_ID} = ? '
+                              f'AND {COLUMN_DAY} = ? '
+                              f'AND {COLUMN_PERSON_ID} IN (SELECT value FROM json_each(?)) '
+                              f'AND {COLUMN_SENT_AT} IS NOT NULL;',
+            'set_greetings_sent': f'UPDATE {TABLE_NAME_GREETING_LOG} '
+                                  f'SET {COLUMN_SENT_AT} = datetime(\'now\') '
+                                  f'WHERE {COLUMN_GUILD_ID} = ? '
+                                  f'AND {COLUMN_DAY} = ? '
+                                  f'AND {COLUMN_PERSON_ID} IN (SELECT value FROM json_each(?));'
+        }
+
+    def write_changes(self, inserts, deletes, guild_ids):
+        with self.borrow(flush=False) as connection:
+            if connection is not None:
+                cursor = connection.cursor()
+                if inserts:
+                    self.execute(cursor, 'write_inserts', inserts, many=True)
+                if deletes:
+                    self.execute(cursor, 'write_deletes', deletes, many=True)
+                if guild_ids:
+                    self.execute(cursor, 'delete_guilds', (to_json(guild_ids),))
+                    self.execute(cursor, 'delete_guilds_log', (to_json(guild_ids),))
+                connection.commit()
+                return True
+            else:
+                return False
+
+    def insert(self, person_id, birthday, guild_id):
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = self.execute(connection.cursor(), 'insert', (person_id, birthday, guild_id))
+                connection.commit()
+                return cursor.rowcount
+            else:
+                return None
+
+    def delete(self, person_id, guild_id):
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = self.execute(connection.cursor(), 'delete', (person_id, guild_id))
+                connection.commit()
+                return cursor.rowcount
+            else:
+                return None
+
+    def delete_all(self, guild_id):
+        return self.write('delete_all', (guild_id,))
+
+    def prune_members(self, guild_id, ranges):
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = connection.cursor()
+                deleted = 0
+                for lower, upper, member_ids in ranges:
+                    deleted += self.execute(cursor, 'prune_members',
+                                            (guild_id, lower, upper, to_json(member_ids))).rowcount
+                connection.commit()
+                return deleted
+            else:
+                return None
+
+    def load_guild_day(self, guild_id, month_day, after=0, limit=None):
+        return self.fetch('load_guild_day', (guild_id, month_day, after, -1 if limit is None else limit))
+
+    def load_guild(self, guild_id):
+        return self.fetch('load_guild', (guild_id,))
+
+    def load_range(self, guild_id, first, last, limit=None):
+        return self.fetch('load_range', (guild_id, first, last, -1 if limit is None else limit))
+
+    def iter_guild(self, guild_id):
+        """SQLite steps through the result row by row, so the cursor streams it without a server side cursor."""
+        with self.borrow() as connection:
+            if connection is None:
+                return
+            cursor = self.execute(connection.cursor(), 'iter_guild', (guild_id,))
+            yield from cursor
+            cursor.close()
+
+    def iter_birthdays(self, guild_id=None):
+        with self.borrow() as connection:
+            if connection is None:
+                return
+            if guild_id is None:
+                cursor = self.execute(connection.cursor(), 'iter_birthdays')
+            else:
+                cursor = self.execute(connection.cursor(), 'iter_guild_birthdays', (guild_id,))
+            yield from cursor
+            cursor.close()
+
+    def import_birthdays(self, chunks):
+        """All chunks are inserted into a temporary staging table and merged into the birthday table
+        with a single statement."""
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = self.execute(connection.cursor(), 'import_create')
+                try:
+                    for chunk in chunks:
+                        self.execute(cursor, 'import_rows', chunk, many=True)
+                    guild_ids = [row[0] for row in self.execute(cursor, 'import_guilds').fetchall()]
+                    merged = self.execute(cursor, 'import_merge').rowcount
+                    connection.commit()
+                    return merged, guild_ids
+                finally:
+                    connection.rollback()
+                    self.execute(cursor, 'import_drop')
+            else:
+                return None
+
+    def set_list_msg(self, guild_id, channel_id, msg_ids):
+        return self.write('set_list_msg', (guild_id, channel_id, to_json(msg_ids)))
+
+    def remove_list_msg(self, guild_id):
+        return self.write('remove_list_msg', (guild_id,))
+
+    def set_channel(self, guild_id, channel_id):
+        return self.write('set_channel', (guild_id, channel_id))
+
+    def set_timezone(self, guild_id, timezone, hour):
+        return self.write('set_timezone', (guild_id, timezone, hour))
+
+    def set_language(self, guild_id, language):
+        return self.write('set_language', (guild_id, language))
+
+    def get_languages(self):
+        return self.fetch('get_languages')
+
+    def set_digest(self, guild_id, weekday):
+        return self.write('set_digest', (guild_id, weekday))
+
+    def claim_digest(self, guild_id, day):
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = self.execute(connection.cursor(), 'claim_digest', (day, guild_id))
+                connection.commit()
+                return cursor.rowcount > 0
+            else:
+                return None
+
+    def get_greeting_settings(self, guild_id=None, shard_count=None, shard_ids=None):
+        if guild_id is not None:
+            return self.fetch('guild_greeting_settings', (guild_id,))
+        elif shard_ids is not None:
+            return self.fetch('shard_greeting_settings', (shard_count, to_json(shard_ids)))
+        else:
+            return self.fetch('greeting_settings')
+
+    def get_channel_settings(self, guild_id=None, shard_count=None, shard_ids=None):
+        if guild_id is not None:
+            rows = self.fetch('guild_channel_settings', (guild_id,))
+        elif shard_ids is not None:
+            rows = self.fetch('shard_channel_settings', (shard_count, to_json(shard_ids)))
+        else:
+            rows = self.fetch('channel_settings')
+        if rows is None:
+            return None
+        return [(guild_id, channel_id, list_channel_id, json.loads(msg_ids) if msg_ids is not None else None)
+                for guild_id, channel_id, list_channel_id, msg_ids in rows]
+
+    def set_last_greeting(self, guild_id, day, log_until):
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = connection.cursor()
+                self.execute(cursor, 'set_last_greeting', (day, guild_id))
+                self.execute(cursor, 'prune_greeting_log', (guild_id, log_until))
+                connection.commit()
+                return True
+            else:
+                return False
+
+    def acquire_lease(self, name, owner, seconds):
+        with self.borrow() as connection:
+            if connection is not None:
+                acquired = self.execute(connection.cursor(), 'acquire_lease', (name, owner, seconds)).fetchone()
+                connection.commit()
+                return acquired is not None
+            else:
+                return None
+
+    def claim_greetings(self, guild_id, day, person_ids, owner, timeout):
+        with self.borrow() as connection:
+            if connection is not None:
+                cursor = self.execute(connection.cursor(), 'claim_greetings',
+                                      (guild_id, day, owner, to_json(person_ids), timeout))
+                claimed = [row[0] for row in cursor.fetchall()]
+                cursor = self.execute(cursor, 'sent_greetings', (guild_id, day, to_json(person_ids)))
+                sent = [row[0] for row in cursor.fetchall()]
+                connection.commit()
+                return claimed, sent
+            else:
+                return None
+
+    def set_greetings_sent(self, guild_id, day, person_ids):
+        return self.write('set_greetings_sent', (guild_id, day, to_json(person_ids)))
@@ -0,0 +1,236 @@
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from discord_birthday_bot import metrics_util
+
+TABLE_NAME_DATA = 'birthday'
+COLUMN_PERSON_ID = 'person_id'
+COLUMN_BIRTHDAY = 'birthday'
+COLUMN_GUILD_ID = 'guild_id'
+COLUMN_MONTH_DAY = 'month_day'
+INDEX_MONTH_DAY = 'birthday_month_day_idx'  # only dropped on update
+INDEX_GUILD_MONTH_DAY = 'birthday_guild_month_day_idx'
+TABLE_NAME_SETTINGS = 'greeting_channel'
+COLUMN_CHANNEL_ID = 'channel_id'
+COLUMN_LIST_MSG_ID = 'list_msg_id'  # only read to migrate from 0.2.x
+COLUMN_LIST_MSG_IDS = 'list_msg_ids'
+COLUMN_lIST_MSG_CH_ID = 'list_msg_ch_id'
+COLUMN_TIMEZONE = 'timezone'
+COLUMN_GREETING_HOUR = 'greeting_hour'
+COLUMN_LAST_GREETING = 'last_greeting'
+COLUMN_DIGEST_WEEKDAY = 'digest_weekday'
+COLUMN_LAST_DIGEST = 'last_digest'
+COLUMN_LANGUAGE = 'language'
+TABLE_NAME_IMPORT = 'birthday_import'
+COLUMN_LINE = 'line'
+TABLE_NAME_LEASE = 'sweep_lease'
+COLUMN_NAME = 'name'
+COLUMN_OWNER = 'owner'
+COLUMN_EXPIRES = 'expires'
+TABLE_NAME_GREETING_LOG = 'greeting_log'
+COLUMN_DAY = 'day'
+COLUMN_CLAIMED_BY = 'claimed_by'
+COLUMN_CLAIMED_AT = 'claimed_at'
+COLUMN_SENT_AT = 'sent_at'
+
+BACKENDS = ('postgresql', 'sqlite')
+
+
+class Storage(ABC):
+    """Interface of the storage backends database_util is built on, one per database engine.
+
+    A backend owns the connections and the SQL of its engine and works with plain values only,
+    the birthday calendar and the write buffer stay in database_util.
+    Like the functions of database_util, every method returns None (False for writes)
+    if the database is not available.
+
+    All statements are built once, fully parameterized, by build_queries and executed by name with execute,
+    which records the duration of every statement."""
+
+    Error = Exception  # base class of the errors raised by the driver of the engine
+
+    def __init__(self):
+        self.before_borrow = None  # called before a connection is borrowed, e.g. to save buffered writes
+        self.queries = self.build_queries()  # statement name -> SQL
+
+    @abstractmethod
+    def build_queries(self):
+        """Returns the SQL of all statements of the engine by their name."""
+
+    @abstractmethod
+    def run(self, cursor, name, params, many):
+        """Executes the statement of the given name on the cursor, with every parameter tuple of params if many."""
+
+    def execute(self, cursor, name, params=(), many=False):
+        """Executes the statement of the given name and records its duration in the histogram query_seconds
+        and its errors in the counter query_errors_total, both labeled with the statement.
+        Returns the cursor."""
+        start = time.perf_counter()
+        failed = True
+        try:
+            self.run(cursor, name, params, many)
+            failed = False
+        finally:
+            seconds = time.perf_counter() - start
+            metrics_util.observe('query_seconds', seconds, statement=name)
+            if failed:
+                metrics_util.inc('query_errors_total', statement=name)
+            metrics_util.log('query', seconds, statement=name)
+        return cursor
+
+    def fetch(self, name, params=()):
+        """Returns all rows of the statement of the given name, None if the database is not available."""
+        with self.borrow() as connection:
+            if connection is not None:
+                return self.execute(connection.cursor(), name, params).fetchall()
+            else:
+                return None
+
+    def write(self, name, params=()):
+        """Executes the statement of the given name in an own transaction. Returns False if the database is not
+        available."""
+        with self.borrow() as connection:
+            if connection is not None:
+                self.execute(connection.cursor(), name, params)
+                connection.commit()
+                return True
+            else:
+                return False
+
+    @abstractmethod
+    def connect(self):
+        """Returns a connection or None if none could be established."""
+
+    @abstractmethod
+    def disconnect(self, connection):
+        """Gives back a connection returned by connect, open transactions are rolled back."""
+
+    @contextmanager
+    def borrow(self, flush=True):
+        """Borrows a connection for the duration of the with block. Yields None if no connection could be established.
+        Unless flush is False, before_borrow is called first, so every query sees the buffered writes."""
+        if flush and self.before_borrow is not None:
+            self.before_borrow()
+        connection = self.connect()
+        try:
+            yield connection
+        finally:
+            self.disconnect(connection)
+
+    def stats(self):
+        """Returns the usage counters of the connections."""
+        return None
+
+    def close(self):
+        """Closes all connections."""
+
+    @abstractmethod
+    def create_tables(self):
+        """Creates the tables and indexes if not already existing and migrates older versions."""
+
+    @abstractmethod
+    def write_changes(self, inserts, deletes, guild_ids):
+        """Saves (person id, birthday, guild id) rows, deletes (person id, guild id) rows
+        and deletes the settings of the guilds in a single transaction."""
+
+    @abstractmethod
+    def insert(self, person_id, birthday, guild_id):
+        """Saves a birthday. Returns the number of changed rows, 0 if the same birthday was saved before."""
+
+    @abstractmethod
+    def delete(self, person_id, guild_id):
+        """Deletes a birthday. Returns the number of deleted rows."""
+
+    @abstractmethod
+    def delete_all(self, guild_id):
+        """Deletes all birthdays of the guild."""
+
+    @abstractmethod
+    def prune_members(self, guild_id, ranges):
+        """Deletes the birthdays of the guild within the (lower, upper, member ids) ranges of person ids,
+        lower excluded, except of the given members. Returns the number of deleted birthdays."""
+
+    @abstractmethod
+    def load_guild_day(self, guild_id, month_day, after=0, limit=None):
+        """Returns (person id, birth year) of the guild on the month-day with a person id greater than after,
+        ordered by the person and at most limit rows."""
+
+    @abstractmethod
+    def load_guild(self, guild_id):
+        """Returns (month-day, person id, birth year) of the guild ordered by month-day and person."""
+
+    @abstractmethod
+    def load_range(self, guild_id, first, last, limit=None):
+        """Returns (month-day, person id, birth year) of the guild between both month-days ordered like load_guild."""
+
+    @abstractmethod
+    def iter_guild(self, guild_id):
+        """Yields (month-day, person id, birth year) of the guild like load_guild, without loading all rows at once."""
+
+    @abstractmethod
+    def iter_birthdays(self, guild_id=None):
+        """Yields (guild id, person id, birthday) of all guilds or only of the given guild."""
+
+    @abstractmethod
+    def import_birthdays(self, chunks):
+        """Merges chunks of (line, person id, birthday, guild id) rows in a single transaction, the last line wins.
+        Returns the number of merged rows and the ids of the affected guilds."""
+
+    @abstractmethod
+    def set_list_msg(self, guild_id, channel_id, msg_ids):
+        """Saves the channel id and the message ids of all pages of the list message of the guild."""
+
+    @abstractmethod
+    def remove_list_msg(self, guild_id):
+        """Removes the channel id and the message ids of the list message of the guild."""
+
+    @abstractmethod
+    def set_channel(self, guild_id, channel_id):
+        """Saves the greeting channel of the guild."""
+
+    @abstractmethod
+    def set_timezone(self, guild_id, timezone, hour):
+        """Saves the timezone and the hour at which the guild is greeted."""
+
+    @abstractmethod
+    def set_language(self, guild_id, language):
+        """Saves the language of the guild, None for the default language."""
+
+    @abstractmethod
+    def get_languages(self):
+        """Returns (guild id, language) of all guilds with an own language."""
+
+    @abstractmethod
+    def set_digest(self, guild_id, weekday):
+        """Saves the weekday of the weekly digest of the guild, None to stop it."""
+
+    @abstractmethod
+    def claim_digest(self, guild_id, day):
+        """Sets the last digest to the day if it is earlier. Returns True if it was changed."""
+
+    @abstractmethod
+    def get_greeting_settings(self, guild_id=None, shard_count=None, shard_ids=None):
+        """Returns (guild id, channel id, timezone, greeting hour, last greeting, digest weekday)
+        of the guilds with a greeting channel, optionally filtered by the guild or by the shards."""
+
+    @abstractmethod
+    def get_channel_settings(self, guild_id=None, shard_count=None, shard_ids=None):
+        """Returns (guild id, channel id, list message channel id, list message ids) of all guilds with settings,
+        optionally filtered by the guild or by the shards."""
+
+    @abstractmethod
+    def set_last_greeting(self, guild_id, day, log_until):
+        """Saves the last greeting and deletes the greeting log of the guild before log_until."""
+
+    @abstractmethod
+    def acquire_lease(self, name, owner, seconds):
+        """Returns True if the owner acquired or renewed the lease, False if another owner holds it."""
+
+    @abstractmethod
+    def claim_greetings(self, guild_id, day, person_ids, owner, timeout):
+        """Returns the ids of the persons whose greetings were claimed and of those whose greetings were sent."""
+
+    @abstractmethod
+    def set_greetings_sent(self, guild_id, day, person_ids):
+        """Marks the claimed greetings of the persons of the guild on the day as sent."""
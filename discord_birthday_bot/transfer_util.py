@@ -0,0 +1,110 @@
+import csv
+import json
+
+from discord_birthday_bot import database_util, date_util
+
+FORMATS = ('csv', 'json')
+FIELDS = ('guild_id', 'person_id', 'birthday')
+IMPORT_CHUNK_SIZE = 10000
+
+
+def guess_format(filename):
+    """Returns the format of the file by its extension. CSV is assumed for unknown extensions."""
+    return 'json' if filename.lower().endswith('.json') else 'csv'
+
+
+def export_birthdays(file, fmt='csv', guild_id=None):
+    """Writes the birthdays of all guilds or only of the given guild as CSV or JSON into the text file.
+    Birthdays without year are written with the year 0001. Returns the number of exported birthdays."""
+    count = 0
+    rows = database_util.iter_birthdays(guild_id)
+    if fmt == 'json':
+        file.write('[')
+        for guild, person, birthday in rows:
+            record = dict(zip(FIELDS, (guild, person, birthday.isoformat())))
+            file.write((',\n  ' if count else '\n  ') + json.dumps(record))
+            count += 1
+        file.write('\n]\n')
+    else:
+        writer = csv.writer(file)
+        writer.writerow(FIELDS)
+        for guild, person, birthday in rows:
+            writer.writerow((guild, person, birthday.isoformat()))
+            count += 1
+    return count
+
+
+def import_birthdays(file, fmt='csv', guild_id=None, progress=None):
+    """Reads the birthdays of a CSV or JSON text file, validates them and imports them in a single transaction.
+    If a guild id is given, all birthdays are imported into that guild and the guild ids of the file are ignored.
+    The progress callback is called with the number of valid and rejected lines after each chunk.
+    Returns the number of imported birthdays (None if the database is not available)
+    and a list of (line, reason) for all rejected lines."""
+    rejected = []
+
+    def chunks():
+        chunk = []
+        valid = 0
+        for line, record in read_records(file, fmt):
+            try:
+                chunk.append((line,) + validate(record, guild_id))
+            except ValueError as error:
+                rejected.append((line, str(error)))
+                continue
+            if len(chunk) == IMPORT_CHUNK_SIZE:
+                valid += len(chunk)
+                yield chunk
+                chunk = []
+                if progress is not None:
+                    progress(valid, len(rejected))
+        if chunk:
+            valid += len(chunk)
+            yield chunk
+        if progress is not None:
+            progress(valid, len(rejected))
+
+    imported = database_util.import_birthdays(chunks())
+    return imported, rejected
+
+
+def read_records(file, fmt):
+    """Yields the line number and the record of every entry of the file.
+    Raises ValueError if the file can't be decoded."""
+    if fmt == 'json':
+        records = json.load(file)
+        if not isinstance(records, list):
+            raise ValueError('JSON file must contain a list of birthdays')
+        yield from enumerate(records, start=1)
+    else:
+        reader = csv.DictReader(file)
+        try:
+            for record in reader:
+                yield reader.line_num, record
+        except csv.Error as error:
+            raise ValueError('line %s: %s' % (reader.line_num, error))
+
+
+def validate(record, guild_id=None):
+    """Returns (person id, birthday, guild id) of the record. Raises ValueError if the record is invalid."""
+    if not isinstance(record, dict):
+        raise ValueError('not a birthday entry')
+    person_id = parse_id(record, 'person_id')
+    if guild_id is None:
+        guild_id = parse_id(record, 'guild_id')
+
+    birthday = record.get('birthday')
+    date = date_util.parse_to_date(str(birthday)) if birthday else None
+    if date is None:
+        raise ValueError('invalid birthday %r' % birthday)
+    return person_id, date.date().isoformat(), guild_id
+
+
+def parse_id(record, field):
+    """Returns the discord id in the field of the record. Raises ValueError if it is missing or invalid."""
+    try:
+        value = int(record[field])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('invalid %s %r' % (field, record.get(field)))
+    if value <= 0:
+        raise ValueError('invalid %s %r' % (field, value))
+    return value
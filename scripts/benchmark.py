@@ -0,0 +1,176 @@
+"""Benchmarks the database, date and rendering hot paths of the bot.
+
+Synthetic guilds are seeded into the configured database and removed afterwards.
+Their ids start at 1, so they can't collide with real discord ids.
+The latencies (p50/p99) and throughput of every operation are printed and written as JSON,
+so the results of different commits can be compared."""
+import asyncio
+import contextlib
+import io
+import json
+import random
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+
+import click
+
+from discord_birthday_bot import async_database_util
+from discord_birthday_bot import config_util as config
+from discord_birthday_bot import database_util
+from discord_birthday_bot import date_util
+from discord_birthday_bot import main
+
+SIZES = (10, 1000, 10000, 100000)
+SAMPLES = 200
+DATE_STRINGS = ('01.02.', '24.12.1990', '2000-12-31', '12/31', '31/12/1999', 'March 3rd 1990')
+
+
+class Guild:
+    """Stand-in for a discord guild, only the id is needed for rendering."""
+
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+def random_birthday():
+    """Returns a random birthday, every fifth one without year. February 29th is left out, as it needs a leap year."""
+    day = date(2001, 1, 1) + timedelta(days=random.randrange(365))
+    return day.replace(year=random.choice((date_util.NO_YEAR, 1970, 1985, 1990, 2001)))
+
+
+def seed(guild_id, size):
+    """Imports size synthetic members into the guild and sets a greeting channel, so the daily check finds them."""
+    rows = [(line, person_id, random_birthday().isoformat(), guild_id)
+            for line, person_id in enumerate(range(1, size + 1))]
+    database_util.import_birthdays([rows])
+    database_util.set_channel(guild_id, guild_id)
+
+
+def measure(func, args):
+    """Calls the function once per argument tuple and returns the durations in seconds."""
+    durations = []
+    for arg in args:
+        start = time.perf_counter()
+        func(*arg)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def percentile(values, p):
+    """Returns the p-th percentile of the values (nearest rank)."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(name, durations):
+    """Returns the latency percentiles in milliseconds and the throughput of an operation."""
+    return {
+        'name': name,
+        'samples': len(durations),
+        'p50_ms': percentile(durations, 50) * 1000,
+        'p99_ms': percentile(durations, 99) * 1000,
+        'ops_per_s': len(durations) / sum(durations) if sum(durations) else float('inf')
+    }
+
+
+def benchmark_database(size, guild_id, loop):
+    """Benchmarks the database functions and the list rendering on a guild of the given size."""
+    results = []
+    guild = Guild(guild_id)
+    persons = [main.Person(random.randint(1, size), random_birthday(), guild_id) for _ in range(SAMPLES)]
+
+    def insert(person):
+        database_util.queue_insert(person)
+        database_util.BUFFER.flush()
+
+    with contextlib.redirect_stdout(io.StringIO()):  # queue_insert logs every birthday
+        results.append(summarize('queue_insert + flush/%s' % size, measure(insert, [(p,) for p in persons])))
+
+    def list_cold():
+        database_util.CALENDAR.invalidate_guild(guild_id)
+        database_util.list_all(guild_id)
+
+    samples = [()] * max(1, min(SAMPLES, 2000000 // size))
+    results.append(summarize('list_all cold/%s' % size, measure(list_cold, samples)))
+    results.append(summarize('list_all warm/%s' % size, measure(database_util.list_all, [(guild_id,)] * SAMPLES)))
+
+    def render():
+        loop.run_until_complete(main.get_birthday_list(guild))
+
+    results.append(summarize('get_birthday_list/%s' % size, measure(render, samples)))
+
+    def children(day):
+        list(database_util.iter_guild_birthday_children(guild_id, day))
+
+    def children_cold(day):
+        database_util.CALENDAR.invalidate_guild(guild_id)
+        children(day)
+
+    days = [(date.today() + timedelta(days=random.randrange(366)),) for _ in range(SAMPLES)]
+    results.append(summarize('iter_guild_birthday_children cold/%s' % size, measure(children_cold, days)))
+    database_util.list_all(guild_id)  # caches the guild
+    results.append(summarize('iter_guild_birthday_children warm/%s' % size, measure(children, days)))
+    return results
+
+
+def benchmark_dates():
+    """Benchmarks parsing and formatting of dates."""
+    results = []
+    for string in DATE_STRINGS:
+        results.append(summarize('parse_to_date %r' % string,
+                                 measure(date_util.parse_to_date, [(string,)] * SAMPLES)))
+
+    dates = [(datetime.combine(random_birthday(), datetime.min.time()),) for _ in range(SAMPLES)]
+    date_util.format_cached.cache_clear()
+    results.append(summarize('parse_to_string cold', measure(date_util.parse_to_string, dates)))
+    results.append(summarize('parse_to_string warm', measure(date_util.parse_to_string, dates)))
+    return results
+
+
+def get_commit():
+    """Returns the current git commit or None outside of a repository."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@click.command(context_settings=main.CONTEXT_SETTINGS)
+@click.option('--sizes', '-z', default=','.join(map(str, SIZES)), help='Comma separated member counts of the guilds')
+@click.option('--output', '-o', type=click.File('w'), default='bench_output.json', help='JSON file of the results')
+@click.option('--seed', 'random_seed', default=0, help='Seed of the synthetic data')
+def benchmark(sizes, output, random_seed):
+    """Seeds synthetic guilds into the configured database and benchmarks the hot paths."""
+    random.seed(random_seed)
+    if not database_util.startup(config.get_db_name(), config.get_db_user(), config.get_db_password(),
+                                 config.get_db_host(), config.get_db_port(),
+                                 pool_min=1, pool_max=config.get_db_pool_max(),
+                                 calendar_size=config.get_calendar_size(),
+                                 backend=config.get_storage_backend(), sqlite_path=config.get_sqlite_path()):
+        raise click.ClickException('Could not connect to the database.')
+    async_database_util.startup(config.get_db_pool_max())
+    loop = asyncio.get_event_loop()
+
+    results = benchmark_dates()
+    for guild_id, size in enumerate((int(size) for size in sizes.split(',')), start=1):
+        seed(guild_id, size)
+        try:
+            results += benchmark_database(size, guild_id, loop)
+        finally:
+            database_util.delete_all(guild_id)
+            database_util.queue_delete_guild(guild_id)
+            database_util.BUFFER.flush()
+
+    for result in results:
+        click.echo('%-40s p50 %9.3f ms  p99 %9.3f ms  %12.1f ops/s'
+                   % (result['name'], result['p50_ms'], result['p99_ms'], result['ops_per_s']))
+    json.dump({'commit': get_commit(), 'time': datetime.now().isoformat(), 'seed': random_seed, 'results': results},
+              output, indent=2)
+
+    async_database_util.shutdown()
+    database_util.shutdown()
+
+
+if __name__ == '__main__':
+    benchmark()
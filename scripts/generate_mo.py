@@ -1,8 +1,11 @@
+"""Compiles the translation catalogs (.po) of the bot into the binary .mo files loaded at startup.
+
+Run it after changing a catalog when running the bot from the source tree, installing with pip does it on its own."""
 import os
 
 from pythongettext import msgfmt
 
-LOCALE_PATH = os.path.join('..', 'discord_birthday_bot', 'locale')
+LOCALE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'discord_birthday_bot', 'locale')
 
 for subdir, dirs, files in os.walk(LOCALE_PATH):
     for filename in files:
@@ -12,7 +12,7 @@ setup(
     author_email='mail@monsi.org',
     description='A small Discord bot that congratulates to your server members on their birthday.',
 
-    python_requires='>=3.5',
+    python_requires='>=3.7',
     entry_points={
         'console_scripts': [
             'dc-birthday-bot=discord_birthday_bot.main:start'
@@ -31,6 +31,7 @@ setup(
         'psycopg2~=2.8.6',
         'appdirs~=1.4.4',
         'APScheduler~=3.6.3',
+        'pytz~=2020.4',
         'Babel~=2.9.0'
     ]
 )
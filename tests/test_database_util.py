@@ -0,0 +1,90 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from collections import namedtuple
+from datetime import date
+
+from discord_birthday_bot import database_util
+
+GUILD_ID = 1 << 22
+
+Person = namedtuple('Person', ('person_id', 'birthday', 'guild_id'))  # the attributes main.Person provides
+
+
+class DatabaseUtilTest(unittest.TestCase):
+    """Runs the calendar, the write buffer and the queries of database_util on a fresh SQLite database."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # The buffer is never flushed by its timer, only before queries and on shutdown #
+        self.assertTrue(database_util.startup(None, None, None, None, None, flush_interval=3600, backend='sqlite',
+                                              sqlite_path=os.path.join(directory.name, 'birthdays.db')))
+        self.addCleanup(database_util.shutdown)
+
+    def add(self, person_id, birthday):
+        with contextlib.redirect_stdout(io.StringIO()):  # queue_insert logs every birthday
+            return database_util.queue_insert(Person(person_id, birthday, GUILD_ID))
+
+    def test_queries_see_the_buffered_writes(self):
+        self.assertTrue(self.add(1, date(1990, 5, 3)))
+        self.assertEqual(database_util.get_buffer_stats()['pending'], 1)
+
+        self.assertEqual(database_util.load_guild(GUILD_ID), [(503, 1, 1990)])
+        self.assertEqual(database_util.get_buffer_stats()['pending'], 0)
+
+        self.assertTrue(database_util.queue_delete(Person(1, None, GUILD_ID)))
+        self.assertEqual(database_util.load_guild(GUILD_ID), [])
+
+    def test_calendar_writes_through(self):
+        self.add(1, date(1990, 5, 3))
+        self.assertEqual(database_util.list_all(GUILD_ID), [(503, 1, 1990)])  # loads and caches the guild
+        misses = database_util.get_calendar_stats()['misses']
+
+        self.assertTrue(self.add(2, date(1985, 1, 2)))
+        self.assertFalse(self.add(2, date(1985, 1, 2)))  # unchanged
+        self.assertEqual(database_util.list_all(GUILD_ID), [(102, 2, 1985), (503, 1, 1990)])
+        self.assertEqual(database_util.get_calendar_stats()['misses'], misses)
+
+    def test_load_overtaken_by_a_write_is_not_cached(self):
+        self.add(1, date(1990, 5, 3))
+        version = database_util.CALENDAR.version()
+        entries = database_util.load_guild(GUILD_ID)
+        self.add(2, date(1985, 1, 2))
+
+        database_util.CALENDAR.put_guild(GUILD_ID, entries, version)
+        self.assertIsNone(database_util.CALENDAR.get_guild(GUILD_ID))
+        self.assertEqual(database_util.list_all(GUILD_ID), [(102, 2, 1985), (503, 1, 1990)])
+
+    def test_upcoming_wraps_around_the_end_of_the_year(self):
+        for person_id, birthday in enumerate([date(1990, 12, 30), date(2000, 1, 2), date(1980, 3, 4)], 1):
+            self.add(person_id, birthday)
+
+        for cached in (False, True):
+            if cached:
+                database_util.list_all(GUILD_ID)
+            upcoming = database_util.get_upcoming(GUILD_ID, date(2023, 12, 29), 7)
+            self.assertEqual(upcoming, [(date(2023, 12, 30), (1230, 1, 1990)), (date(2024, 1, 2), (102, 2, 2000))])
+
+    def test_upcoming_limit_keeps_the_next_birthdays(self):
+        for person_id, birthday in enumerate([date(1990, 1, 1), date(1990, 12, 30), date(2000, 1, 2)], 1):
+            self.add(person_id, birthday)
+
+        for cached in (False, True):
+            if cached:
+                database_util.list_all(GUILD_ID)
+            upcoming = database_util.get_upcoming(GUILD_ID, date(2023, 12, 29), 366, limit=2)
+            self.assertEqual(upcoming, [(date(2023, 12, 30), (1230, 2, 1990)), (date(2024, 1, 1), (101, 1, 1990))])
+
+    def test_february_29th_is_only_celebrated_in_leap_years(self):
+        self.add(1, date(2000, 2, 29))
+
+        self.assertEqual(database_util.get_upcoming(GUILD_ID, date(2023, 2, 27), 3), [])
+        self.assertEqual(database_util.get_upcoming(GUILD_ID, date(2024, 2, 27), 3),
+                         [(date(2024, 2, 29), (229, 1, 2000))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from datetime import datetime
+
+from discord_birthday_bot import date_util
+from discord_birthday_bot.date_util import NO_YEAR
+
+
+class ParseNumericTest(unittest.TestCase):
+    """Checks the common numeric formats parsed without dateparser."""
+
+    def test_day_first(self):
+        self.assertEqual(date_util.parse_numeric('24.12.1990', 'de'), datetime(1990, 12, 24))
+        self.assertEqual(date_util.parse_numeric('1.2.', 'en'), datetime(NO_YEAR, 2, 1))
+
+    def test_iso(self):
+        self.assertEqual(date_util.parse_numeric('2000-12-31', 'de'), datetime(2000, 12, 31))
+
+    def test_slash_depends_on_the_language(self):
+        self.assertEqual(date_util.parse_numeric('12/31', 'en'), datetime(NO_YEAR, 12, 31))
+        self.assertEqual(date_util.parse_numeric('31/12/1999', 'de'), datetime(1999, 12, 31))
+        self.assertIsNone(date_util.parse_numeric('31/12/1999', 'en'))
+
+    def test_invalid_and_unknown_formats(self):
+        self.assertIsNone(date_util.parse_numeric('31.02.', 'de'))
+        self.assertIsNone(date_util.parse_numeric('24.12.90', 'de'))
+        self.assertIsNone(date_util.parse_numeric('March 3rd 1990', 'en'))
+
+    def test_parse_to_date_drops_the_current_year(self):
+        self.assertEqual(date_util.parse_to_date('24.12.%s' % datetime.now().year), datetime(NO_YEAR, 12, 24))
+        self.assertEqual(date_util.parse_to_date(' 2000-12-31 '), datetime(2000, 12, 31))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from discord_birthday_bot import sqlite_util
+
+GUILD_ID = 1 << 22
+OTHER_GUILD_ID = 2 << 22
+
+
+class SqliteStorageTest(unittest.TestCase):
+    """Runs the statements of the SQLite backend against a fresh database file."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = sqlite_util.SqliteStorage(os.path.join(directory.name, 'birthdays.db'))
+        self.addCleanup(self.storage.close)
+        self.assertTrue(self.storage.create_tables())
+
+    def test_insert_and_list(self):
+        self.assertEqual(self.storage.insert(3, date(1990, 12, 30), GUILD_ID), 1)
+        self.assertEqual(self.storage.insert(1, date(1, 1, 5), GUILD_ID), 1)
+        self.assertEqual(self.storage.insert(2, date(2000, 1, 5), GUILD_ID), 1)
+        self.assertEqual(self.storage.insert(4, date(1985, 6, 1), OTHER_GUILD_ID), 1)
+
+        self.assertEqual(self.storage.insert(1, date(1, 1, 5), GUILD_ID), 0)  # unchanged
+        self.assertEqual(self.storage.load_guild(GUILD_ID), [(105, 1, 1), (105, 2, 2000), (1230, 3, 1990)])
+        self.assertEqual(list(self.storage.iter_guild(GUILD_ID)), self.storage.load_guild(GUILD_ID))
+
+        self.assertEqual(self.storage.delete(2, GUILD_ID), 1)
+        self.assertEqual(self.storage.load_guild(GUILD_ID), [(105, 1, 1), (1230, 3, 1990)])
+
+    def test_load_range_wraps_around_the_end_of_the_year(self):
+        for person_id, birthday in enumerate([date(1990, 1, 2), date(1990, 3, 4), date(1990, 12, 30),
+                                              date(1990, 12, 31)], 1):
+            self.storage.insert(person_id, birthday, GUILD_ID)
+
+        self.assertEqual(self.storage.load_range(GUILD_ID, 1230, 1231), [(1230, 3, 1990), (1231, 4, 1990)])
+        self.assertEqual(self.storage.load_range(GUILD_ID, 101, 105), [(102, 1, 1990)])
+        self.assertEqual(self.storage.load_range(GUILD_ID, 1230, 1231, 1), [(1230, 3, 1990)])
+
+    def test_guild_day_is_read_in_chunks(self):
+        for person_id in range(1, 6):
+            self.storage.insert(person_id, date(1990 + person_id, 5, 3), GUILD_ID)
+        self.storage.insert(9, date(1990, 5, 4), GUILD_ID)
+
+        self.assertEqual(self.storage.load_guild_day(GUILD_ID, 503), [(i, 1990 + i) for i in range(1, 6)])
+        self.assertEqual(self.storage.load_guild_day(GUILD_ID, 503, 0, 2), [(1, 1991), (2, 1992)])
+        self.assertEqual(self.storage.load_guild_day(GUILD_ID, 503, 2, 2), [(3, 1993), (4, 1994)])
+        self.assertEqual(self.storage.load_guild_day(GUILD_ID, 503, 4, 2), [(5, 1995)])
+
+    def test_lease(self):
+        self.assertTrue(self.storage.acquire_lease('sweep-0', 'a', 60))
+        self.assertTrue(self.storage.acquire_lease('sweep-0', 'a', 60))  # renewed
+        self.assertFalse(self.storage.acquire_lease('sweep-0', 'b', 60))
+        self.assertTrue(self.storage.acquire_lease('sweep-1', 'b', 60))
+
+    def test_greetings_are_claimed_once(self):
+        day = date(2024, 5, 3)
+        claimed, sent = self.storage.claim_greetings(GUILD_ID, day, [1, 2], 'a', 600)
+        self.assertEqual((sorted(claimed), sent), ([1, 2], []))
+        self.assertEqual(self.storage.claim_greetings(GUILD_ID, day, [1, 2, 3], 'b', 600), ([3], []))
+
+        # Unsent greetings are claimed again after the timeout, sent ones never #
+        self.assertTrue(self.storage.set_greetings_sent(GUILD_ID, day, [1]))
+        self.assertEqual(self.storage.claim_greetings(GUILD_ID, day, [1, 2], 'b', -1), ([2], [1]))
+
+    def test_import_merges_and_the_last_line_wins(self):
+        self.storage.insert(1, date(1990, 1, 1), GUILD_ID)
+        chunks = [[(1, 1, date(1991, 2, 2), GUILD_ID), (2, 2, date(1992, 3, 3), GUILD_ID)],
+                  [(3, 1, date(1993, 4, 4), GUILD_ID), (4, 5, date(1995, 5, 5), OTHER_GUILD_ID)]]
+
+        merged, guild_ids = self.storage.import_birthdays(chunks)
+
+        self.assertEqual(merged, 3)
+        self.assertEqual(sorted(guild_ids), [GUILD_ID, OTHER_GUILD_ID])
+        self.assertEqual(self.storage.load_guild(GUILD_ID), [(303, 2, 1992), (404, 1, 1993)])
+        self.assertEqual(self.storage.load_guild(OTHER_GUILD_ID), [(505, 5, 1995)])
+
+
+if __name__ == '__main__':
+    unittest.main()